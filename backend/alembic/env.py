@@ -54,7 +54,13 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite can only alter tables by copying them
+            render_as_batch=connection.dialect.name == "sqlite",
+            # Revisions using app.database.migrations commit partway through,
+            # so each revision is committed and stamped on its own
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
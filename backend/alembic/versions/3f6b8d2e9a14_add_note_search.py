@@ -0,0 +1,37 @@
+"""Add full-text search over notes
+
+Revision ID: 3f6b8d2e9a14
+Revises: e2a7c9d41f86
+Create Date: 2026-10-19 14:05:12.418733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.database.search import SQLITE_FTS_DDL, POSTGRES_FTS_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b8d2e9a14'
+down_revision = 'e2a7c9d41f86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        # Index the notes that already exist
+        op.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+    else:
+        for statement in POSTGRES_FTS_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('notes_fts_insert', 'notes_fts_delete', 'notes_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS notes_fts")
+    else:
+        op.execute("DROP INDEX IF EXISTS ix_notes_fulltext")
@@ -0,0 +1,127 @@
+"""Store blob references in notes as paths instead of absolute URLs
+
+Revision ID: 4a9d2c6e8b15
+Revises: 8e3f6a2c9d14
+Create Date: 2026-10-20 09:12:37.401552
+
+"""
+import logging
+import os
+from alembic import op
+import sqlalchemy as sa
+from app.database.migrations import autocommit, run_in_transaction
+from app.services.cache import cache, note_key
+from app.services.revisions import REVISION_SNAPSHOT_INTERVAL, apply_delta, compute_delta
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9d2c6e8b15'
+down_revision = '8e3f6a2c9d14'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger(__name__)
+
+# Notes used to embed blob URLs under this prefix, which defaulted to the development server
+OLD_PREFIX = os.getenv('BLOB_URL_PREFIX', 'http://localhost:8000/api/blobs').rstrip('/')
+BLOB_PATH = '/api/blobs'
+
+notes = sa.table(
+    'notes', sa.column('id'), sa.column('owner_id'), sa.column('title'), sa.column('content'),
+    sa.column('is_chunked'), sa.column('version'),
+)
+note_chunks = sa.table('note_chunks', sa.column('note_id'), sa.column('seq'), sa.column('data'), sa.column('size'))
+note_revisions = sa.table(
+    'note_revisions', sa.column('id'), sa.column('note_id'), sa.column('owner_id'), sa.column('version'),
+    sa.column('title'), sa.column('is_snapshot'), sa.column('data'),
+)
+
+
+def rewrite(text: str) -> str:
+    return text.replace(OLD_PREFIX + '/', BLOB_PATH + '/')
+
+
+def rewrite_note(note_id: int):
+    """Rewrite the live content and every revision of a note, bumping its version
+    
+    Revisions are reverse deltas against character offsets of the next
+    newer version, so each version is rebuilt, rewritten, and its delta
+    computed again against the rewritten newer version.
+    """
+    bind = op.get_bind()
+    note = bind.execute(sa.select(notes).where(notes.c.id == note_id).with_for_update()).first()
+    if note.is_chunked:
+        chunks = bind.execute(
+            sa.select(note_chunks.c.seq, note_chunks.c.data)
+            .where(note_chunks.c.note_id == note_id)
+            .order_by(note_chunks.c.seq)
+        ).all()
+        # A reference split across two chunks keeps working as an absolute URL
+        live = ''.join(chunk.data for chunk in chunks)
+        new_live = ''.join(rewrite(chunk.data) for chunk in chunks)
+        for chunk in chunks:
+            data = rewrite(chunk.data)
+            if data != chunk.data:
+                bind.execute(
+                    note_chunks.update()
+                    .where(note_chunks.c.note_id == note_id, note_chunks.c.seq == chunk.seq)
+                    .values(data=data, size=len(data.encode()))
+                )
+    else:
+        live, new_live = note.content, rewrite(note.content)
+    
+    history = bind.execute(
+        sa.select(note_revisions)
+        .where(note_revisions.c.note_id == note_id)
+        .order_by(note_revisions.c.version.desc())
+    ).all()
+    newer, new_newer = live, new_live
+    for revision_row in history:
+        content = revision_row.data if revision_row.is_snapshot else apply_delta(newer, revision_row.data)
+        new_content = rewrite(content)
+        data = new_content if revision_row.is_snapshot else compute_delta(new_newer, new_content)
+        if data != revision_row.data:
+            bind.execute(note_revisions.update().where(note_revisions.c.id == revision_row.id).values(data=data))
+        newer, new_newer = content, new_content
+    
+    # The version bump keeps a revision like any other write, spaced as record_revision spaces them
+    deltas_since_snapshot = next((i for i, row in enumerate(history) if row.is_snapshot), len(history))
+    is_snapshot = deltas_since_snapshot >= REVISION_SNAPSHOT_INTERVAL - 1
+    bind.execute(note_revisions.insert().values(
+        note_id=note_id,
+        owner_id=note.owner_id,
+        version=note.version,
+        title=note.title,
+        is_snapshot=is_snapshot,
+        data=new_live if is_snapshot else compute_delta(new_live, new_live),
+    ))
+    # A new version keeps clients from revalidating their copies with the absolute URLs
+    values = {'version': note.version + 1}
+    if not note.is_chunked:
+        values['content'] = new_live
+    bind.execute(notes.update().where(notes.c.id == note_id, notes.c.owner_id == note.owner_id).values(**values))
+    return note.owner_id
+
+
+def upgrade() -> None:
+    if OLD_PREFIX == BLOB_PATH:
+        return
+    pattern = f'%{OLD_PREFIX}/%'
+    # Older versions can hold references the live content no longer has
+    affected = sa.select(notes.c.id).where(sa.or_(
+        notes.c.content.like(pattern),
+        notes.c.id.in_(sa.select(note_chunks.c.note_id).where(note_chunks.c.data.like(pattern))),
+        notes.c.id.in_(sa.select(note_revisions.c.note_id).where(note_revisions.c.data.like(pattern))),
+    )).order_by(notes.c.id)
+    with autocommit():
+        note_ids = op.get_bind().execute(affected).scalars().all()
+        # One transaction per note, so a rerun after an interruption skips the rewritten ones
+        for note_id in note_ids:
+            owner_id = run_in_transaction(lambda: rewrite_note(note_id))
+            cache.delete(note_key(owner_id, note_id))
+    logger.info("Rewrote blob references in %d notes", len(note_ids))
+
+
+def downgrade() -> None:
+    # The paths work for every client that could follow the old absolute URLs
+    pass
@@ -0,0 +1,26 @@
+"""Add version columns for optimistic concurrency
+
+Revision ID: 5b8e2c41d7a9
+Revises: 27d6bd07025f
+Create Date: 2026-10-19 09:12:04.511230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2c41d7a9'
+down_revision = '27d6bd07025f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('folders', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('notes', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('notes', 'version')
+    op.drop_column('folders', 'version')
@@ -0,0 +1,209 @@
+"""Add owners and hash-partition notes on owner_id
+
+Revision ID: 6c2e8f4a1b93
+Revises: a7d4e2f91c36
+Create Date: 2026-10-19 21:34:52.618204
+
+On PostgreSQL the notes table is rebuilt as a hash-partitioned table while
+the application keeps running: a trigger mirrors writes into the new table,
+existing rows are copied over in short batches, and the two tables are
+swapped in one brief transaction at the end.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.database.migrations import autocommit, create_index_concurrently, run_batched, run_in_transaction
+from app.database.search import SQLITE_FTS_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2e8f4a1b93'
+down_revision = 'a7d4e2f91c36'
+branch_labels = None
+depends_on = None
+
+NOTE_PARTITIONS = 16
+
+NOTE_INDEXES = [
+    ('ix_notes_id', '(id)'),
+    ('ix_notes_trash', '(deleted_at) WHERE is_deleted'),
+    ('ix_notes_recent', '(owner_id, updated_at, id) WHERE NOT is_deleted'),
+    ('ix_notes_folder_recent', '(folder_id, updated_at, id) WHERE NOT is_deleted'),
+    ('ix_notes_fulltext', "USING gin (to_tsvector('simple', title || ' ' || content))"),
+]
+TRIGRAM_INDEX = ('ix_notes_title_trgm', 'USING gin (title gin_trgm_ops) WHERE NOT is_deleted')
+
+SYNC_TRIGGER = [
+    """
+    CREATE FUNCTION notes_partitioned_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            DELETE FROM notes_partitioned WHERE id = OLD.id AND owner_id = OLD.owner_id;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            INSERT INTO notes_partitioned SELECT NEW.*;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "CREATE TRIGGER notes_partitioned_sync AFTER INSERT OR UPDATE OR DELETE ON notes "
+    "FOR EACH ROW EXECUTE FUNCTION notes_partitioned_sync()",
+]
+
+SWAP = [
+    "LOCK TABLE notes IN ACCESS EXCLUSIVE MODE",
+    "DROP TRIGGER notes_partitioned_sync ON notes",
+    "DROP FUNCTION notes_partitioned_sync()",
+    "ALTER TABLE note_revisions DROP CONSTRAINT note_revisions_note_id_fkey",
+    "ALTER TABLE note_chunks DROP CONSTRAINT note_chunks_note_id_fkey",
+    "ALTER SEQUENCE notes_id_seq OWNED BY notes_partitioned.id",
+    "ALTER TABLE notes RENAME TO notes_unpartitioned",
+    "ALTER TABLE notes_partitioned RENAME TO notes",
+    # Partitioned tables can only be referenced through keys that include owner_id
+    "ALTER TABLE note_revisions ADD CONSTRAINT fk_note_revisions_note_owner FOREIGN KEY (note_id, owner_id) "
+    "REFERENCES notes (id, owner_id) ON DELETE CASCADE NOT VALID",
+    "ALTER TABLE note_chunks ADD CONSTRAINT fk_note_chunks_note_owner FOREIGN KEY (note_id, owner_id) "
+    "REFERENCES notes (id, owner_id) ON DELETE CASCADE NOT VALID",
+]
+
+
+def _has_index(bind, name):
+    return bind.execute(sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": name}).first() is not None
+
+
+def upgrade() -> None:
+    # A constant default keeps these additions catalog-only on PostgreSQL;
+    # every existing row belongs to the default owner
+    for table in ('folders', 'notes', 'note_revisions', 'note_chunks'):
+        op.add_column(table, sa.Column('owner_id', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('jobs', sa.Column('owner_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_jobs_owner_id'), 'jobs', ['owner_id'], unique=False)
+    
+    if op.get_bind().dialect.name == 'postgresql':
+        upgrade_postgresql()
+        return
+    
+    # SQLite installs have a single user, so there is nothing to partition and
+    # the existing single-column foreign keys are kept
+    op.create_index('uq_folders_id_owner', 'folders', ['id', 'owner_id'], unique=True)
+    op.create_index('ix_folders_owner_parent', 'folders', ['owner_id', 'parent_id'], unique=False)
+    op.create_index('uq_notes_id_owner', 'notes', ['id', 'owner_id'], unique=True)
+    op.drop_index('ix_notes_recent', table_name='notes')
+    op.create_index(
+        'ix_notes_recent', 'notes', ['owner_id', 'updated_at', 'id'], unique=False,
+        sqlite_where=sa.text('is_deleted = 0'),
+    )
+
+
+def upgrade_postgresql() -> None:
+    bind = op.get_bind()
+    # Every step commits on its own, so no lock is held longer than one statement
+    with autocommit():
+        create_index_concurrently('uq_folders_id_owner', 'folders', ['id', 'owner_id'], unique=True)
+        create_index_concurrently('ix_folders_owner_parent', 'folders', ['owner_id', 'parent_id'])
+        op.execute("ALTER TABLE folders ADD CONSTRAINT uq_folders_id_owner UNIQUE USING INDEX uq_folders_id_owner")
+        op.execute(
+            "ALTER TABLE folders ADD CONSTRAINT fk_folders_parent_owner FOREIGN KEY (parent_id, owner_id) "
+            "REFERENCES folders (id, owner_id) NOT VALID"
+        )
+        op.execute("ALTER TABLE folders VALIDATE CONSTRAINT fk_folders_parent_owner")
+        op.execute("ALTER TABLE folders DROP CONSTRAINT folders_parent_id_fkey")
+        
+        # The new table gets its indexes while empty, so the copy maintains them
+        # instead of building them under a lock afterwards
+        op.execute("CREATE TABLE notes_partitioned (LIKE notes INCLUDING DEFAULTS) PARTITION BY HASH (owner_id)")
+        op.execute("ALTER TABLE notes_partitioned ADD CONSTRAINT notes_partitioned_pkey PRIMARY KEY (id, owner_id)")
+        for remainder in range(NOTE_PARTITIONS):
+            op.execute(
+                f"CREATE TABLE notes_p{remainder} PARTITION OF notes_partitioned "
+                f"FOR VALUES WITH (MODULUS {NOTE_PARTITIONS}, REMAINDER {remainder})"
+            )
+        op.execute(
+            "ALTER TABLE notes_partitioned ADD CONSTRAINT fk_notes_folder_owner FOREIGN KEY (folder_id, owner_id) "
+            "REFERENCES folders (id, owner_id)"
+        )
+        indexes = NOTE_INDEXES + ([TRIGRAM_INDEX] if _has_index(bind, TRIGRAM_INDEX[0]) else [])
+        for name, definition in indexes:
+            op.execute(f"CREATE INDEX {name}_new ON notes_partitioned {definition}")
+        
+        for statement in SYNC_TRIGGER:
+            op.execute(statement)
+        # Locking each batch of source rows orders the copy against concurrent
+        # writes, whose trigger then replaces the copied row
+        run_batched(
+            'copy notes to notes_partitioned', 'notes',
+            "INSERT INTO notes_partitioned SELECT * FROM notes WHERE id > :low AND id <= :high "
+            "FOR SHARE ON CONFLICT DO NOTHING",
+        )
+        
+        # Long-running queries on notes can hold up the swap; it is retried
+        # rather than left queued in front of every other request
+        run_in_transaction(lambda: [op.execute(statement) for statement in SWAP])
+        
+        op.execute("ALTER TABLE note_revisions VALIDATE CONSTRAINT fk_note_revisions_note_owner")
+        op.execute("ALTER TABLE note_chunks VALIDATE CONSTRAINT fk_note_chunks_note_owner")
+        op.execute("DROP TABLE notes_unpartitioned")
+        op.execute("ALTER TABLE notes RENAME CONSTRAINT notes_partitioned_pkey TO notes_pkey")
+        for name, _ in indexes:
+            op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        downgrade_postgresql()
+    else:
+        op.drop_index('ix_notes_recent', table_name='notes')
+        op.create_index(
+            'ix_notes_recent', 'notes', ['updated_at', 'id'], unique=False,
+            sqlite_where=sa.text('is_deleted = 0'),
+        )
+        op.drop_index('uq_notes_id_owner', table_name='notes')
+        op.drop_index('ix_folders_owner_parent', table_name='folders')
+        op.drop_index('uq_folders_id_owner', table_name='folders')
+    
+    op.drop_index(op.f('ix_jobs_owner_id'), table_name='jobs')
+    op.drop_column('jobs', 'owner_id')
+    for table in ('note_chunks', 'note_revisions', 'notes', 'folders'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('owner_id')
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
+
+
+def downgrade_postgresql() -> None:
+    # Copies the notes back into a plain table in one transaction; writes to
+    # notes are blocked while it runs
+    bind = op.get_bind()
+    has_trigram = _has_index(bind, TRIGRAM_INDEX[0])
+    op.execute("CREATE TABLE notes_unpartitioned (LIKE notes INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO notes_unpartitioned SELECT * FROM notes")
+    op.execute("ALTER TABLE note_revisions DROP CONSTRAINT fk_note_revisions_note_owner")
+    op.execute("ALTER TABLE note_chunks DROP CONSTRAINT fk_note_chunks_note_owner")
+    op.execute("ALTER SEQUENCE notes_id_seq OWNED BY notes_unpartitioned.id")
+    op.execute("DROP TABLE notes")
+    op.execute("ALTER TABLE notes_unpartitioned RENAME TO notes")
+    op.execute("ALTER TABLE notes ADD CONSTRAINT notes_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE notes ADD CONSTRAINT notes_folder_id_fkey FOREIGN KEY (folder_id) REFERENCES folders (id)")
+    indexes = [
+        (name, '(updated_at, id) WHERE NOT is_deleted' if name == 'ix_notes_recent' else definition)
+        for name, definition in NOTE_INDEXES
+    ] + ([TRIGRAM_INDEX] if has_trigram else [])
+    for name, definition in indexes:
+        op.execute(f"CREATE INDEX {name} ON notes {definition}")
+    op.execute(
+        "ALTER TABLE note_revisions ADD CONSTRAINT note_revisions_note_id_fkey FOREIGN KEY (note_id) "
+        "REFERENCES notes (id) ON DELETE CASCADE"
+    )
+    op.execute(
+        "ALTER TABLE note_chunks ADD CONSTRAINT note_chunks_note_id_fkey FOREIGN KEY (note_id) "
+        "REFERENCES notes (id) ON DELETE CASCADE"
+    )
+    
+    op.execute(
+        "ALTER TABLE folders ADD CONSTRAINT folders_parent_id_fkey FOREIGN KEY (parent_id) REFERENCES folders (id)"
+    )
+    op.execute("ALTER TABLE folders DROP CONSTRAINT fk_folders_parent_owner")
+    op.execute("ALTER TABLE folders DROP CONSTRAINT uq_folders_id_owner")
+    op.drop_index('ix_folders_owner_parent', table_name='folders')
@@ -0,0 +1,36 @@
+"""Add tags to notes with a GIN index for tag filters
+
+Revision ID: 8e3f6a2c9d14
+Revises: 1d8b5f3e7a62
+Create Date: 2026-10-19 23:05:48.902716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from app.database.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3f6a2c9d14'
+down_revision = '1d8b5f3e7a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # A constant default keeps the new column catalog-only
+        op.add_column('notes', sa.Column('tags', postgresql.ARRAY(sa.String(length=50)), server_default='{}', nullable=False))
+        create_index_concurrently(
+            'ix_notes_tags', 'notes', ['tags'], postgresql_using='gin', postgresql_with={'fastupdate': 'off'},
+            postgresql_where=sa.text('NOT is_deleted'),
+        )
+    else:
+        op.add_column('notes', sa.Column('tags', sa.JSON(), server_default='[]', nullable=False))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        drop_index_concurrently('ix_notes_tags', 'notes')
+    op.drop_column('notes', 'tags')
@@ -0,0 +1,29 @@
+"""Add deleted_at to notes for trash retention
+
+Revision ID: 9c4f1a7e3b20
+Revises: 5b8e2c41d7a9
+Create Date: 2026-10-19 11:03:27.908114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f1a7e3b20'
+down_revision = '5b8e2c41d7a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('notes', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    # Existing tombstones start their retention period now
+    notes = sa.table('notes', sa.column('is_deleted', sa.Boolean), sa.column('deleted_at', sa.DateTime))
+    op.execute(notes.update().where(notes.c.is_deleted == sa.true()).values(deleted_at=sa.func.now()))
+    op.create_index('ix_notes_trash', 'notes', ['deleted_at'], unique=False, postgresql_where=sa.text('is_deleted'), sqlite_where=sa.text('is_deleted'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_trash', table_name='notes', postgresql_where=sa.text('is_deleted'), sqlite_where=sa.text('is_deleted'))
+    op.drop_column('notes', 'deleted_at')
@@ -0,0 +1,55 @@
+"""Backfill notes.updated_at and index the recent feed
+
+Revision ID: b41e7c9a2d58
+Revises: 3f6b8d2e9a14
+Create Date: 2026-10-19 15:22:48.603127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.database.search import SQLITE_FTS_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41e7c9a2d58'
+down_revision = '3f6b8d2e9a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Notes that were never edited only have created_at
+    notes = sa.table('notes', sa.column('created_at', sa.DateTime), sa.column('updated_at', sa.DateTime))
+    op.execute(
+        notes.update()
+        .where(notes.c.updated_at.is_(None))
+        .values(updated_at=sa.func.coalesce(notes.c.created_at, sa.func.now()))
+    )
+    with op.batch_alter_table('notes') as batch_op:
+        batch_op.alter_column(
+            'updated_at',
+            existing_type=sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        )
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
+    op.create_index(
+        'ix_notes_recent', 'notes', ['updated_at', 'id'], unique=False,
+        postgresql_where=sa.text('NOT is_deleted'), sqlite_where=sa.text('is_deleted = 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_recent', table_name='notes')
+    with op.batch_alter_table('notes') as batch_op:
+        batch_op.alter_column(
+            'updated_at',
+            existing_type=sa.DateTime(timezone=True),
+            nullable=True,
+            server_default=None,
+        )
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
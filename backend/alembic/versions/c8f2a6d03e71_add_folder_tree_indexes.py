@@ -0,0 +1,29 @@
+"""Index folder parents and notes by folder for subtree queries
+
+Revision ID: c8f2a6d03e71
+Revises: b41e7c9a2d58
+Create Date: 2026-10-19 16:48:05.217940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f2a6d03e71'
+down_revision = 'b41e7c9a2d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_folders_parent_id'), 'folders', ['parent_id'], unique=False)
+    op.create_index(
+        'ix_notes_folder_recent', 'notes', ['folder_id', 'updated_at', 'id'], unique=False,
+        postgresql_where=sa.text('NOT is_deleted'), sqlite_where=sa.text('is_deleted = 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_folder_recent', table_name='notes')
+    op.drop_index(op.f('ix_folders_parent_id'), table_name='folders')
@@ -0,0 +1,32 @@
+"""Add trigram indexes for autocomplete
+
+Revision ID: d5a9e3b17f42
+Revises: c8f2a6d03e71
+Create Date: 2026-10-19 17:31:44.092518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.database.search import TRIGRAM_DDL, trigram_installable
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9e3b17f42'
+down_revision = 'c8f2a6d03e71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # pg_trgm ships with contrib; without it autocomplete falls back to LIKE
+    if not trigram_installable(op.get_bind()):
+        return
+    for statement in TRIGRAM_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_folders_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_notes_title_trgm")
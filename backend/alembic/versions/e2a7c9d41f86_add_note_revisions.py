@@ -0,0 +1,37 @@
+"""Add note revision history
+
+Revision ID: e2a7c9d41f86
+Revises: 9c4f1a7e3b20
+Create Date: 2026-10-19 12:40:51.276043
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c9d41f86'
+down_revision = '9c4f1a7e3b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('note_revisions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=500), nullable=False),
+    sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('note_id', 'version', name='uq_note_revisions_note_version')
+    )
+    op.create_index(op.f('ix_note_revisions_id'), 'note_revisions', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_note_revisions_id'), table_name='note_revisions')
+    op.drop_table('note_revisions')
@@ -0,0 +1,47 @@
+"""Store large note content in chunks
+
+Revision ID: f3c1b7e59a20
+Revises: d5a9e3b17f42
+Create Date: 2026-10-19 18:56:13.744021
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.database.search import SQLITE_FTS_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c1b7e59a20'
+down_revision = 'd5a9e3b17f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('notes', sa.Column('is_chunked', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.create_table('note_chunks',
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('note_id', 'seq')
+    )
+
+
+def downgrade() -> None:
+    # Fold chunked content back into the notes table
+    if op.get_bind().dialect.name == 'postgresql':
+        joined = "SELECT string_agg(data, '' ORDER BY seq) FROM note_chunks WHERE note_chunks.note_id = notes.id"
+    else:
+        joined = (
+            "SELECT group_concat(data, '') FROM "
+            "(SELECT data FROM note_chunks WHERE note_chunks.note_id = notes.id ORDER BY seq)"
+        )
+    op.execute(f"UPDATE notes SET content = COALESCE(({joined}), '') WHERE is_chunked")
+    op.drop_table('note_chunks')
+    with op.batch_alter_table('notes') as batch_op:
+        batch_op.drop_column('is_chunked')
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
@@ -1,16 +1,95 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from app.database.slow_queries import instrument
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
-engine = create_engine(DATABASE_URL)
+# Replica routing settings
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "1"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+READ_YOUR_WRITES_COOKIE = "mynotes_last_write"
+
+# psycopg 3 (postgresql+psycopg:// URLs) prepares a statement on the server
+# once a connection has run it this many times; empty disables prepared
+# statements, e.g. behind a transaction-pooling PgBouncer
+PG_PREPARE_THRESHOLD = os.getenv("PG_PREPARE_THRESHOLD", "5")
+
+# Applied to every SQLite connection; WAL lets readers run alongside the writer
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": "5000",
+    "cache_size": "-65536",
+    "temp_store": "MEMORY",
+    "mmap_size": "268435456",
+}
+
+def create_psycopg_engine(url, **kwargs):
+    """Create a psycopg 3 engine using server-side prepared statements
+    
+    Statements executed with the "prepare" execution option are prepared
+    on their first run instead of after PG_PREPARE_THRESHOLD runs, which
+    suits the hot queries every request repeats.
+    """
+    threshold = int(PG_PREPARE_THRESHOLD) if PG_PREPARE_THRESHOLD else None
+    psycopg_engine = create_engine(url, connect_args={"prepare_threshold": threshold}, **kwargs)
+    
+    if threshold is not None:
+        @event.listens_for(psycopg_engine, "do_execute")
+        def execute_prepared(cursor, statement, parameters, context):
+            if context.execution_options.get("prepare"):
+                cursor.execute(statement, parameters, prepare=True)
+                return True
+    
+    return psycopg_engine
+
+def create_database_engine(url, **kwargs):
+    """Create an engine for PostgreSQL or SQLite, tuning SQLite connections
+    
+    Every engine logs statements slower than SLOW_QUERY_MS; see
+    app/database/slow_queries.py.
+    """
+    if make_url(url).get_driver_name() == "psycopg":
+        db_engine = create_psycopg_engine(url, **kwargs)
+    elif not url.startswith("sqlite"):
+        db_engine = create_engine(url, **kwargs)
+    else:
+        db_engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+        
+        @event.listens_for(db_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    
+    instrument(db_engine)
+    return db_engine
+
+engine = create_database_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engine = None
+ReadSessionLocal = None
+if DATABASE_READ_URL:
+    read_engine = create_database_engine(
+        DATABASE_READ_URL,
+        execution_options={"postgresql_readonly": True},
+    )
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -18,4 +97,72 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()      
\ No newline at end of file
+        db.close()
+
+_replica_state = {"checked_at": 0.0, "healthy": False}
+_replica_lock = threading.Lock()
+
+def replica_is_fresh():
+    """Return True if the replica is reachable and within the allowed lag"""
+    if read_engine is None:
+        return False
+    
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] < REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_state["healthy"]
+    
+    with _replica_lock:
+        if now - _replica_state["checked_at"] < REPLICA_LAG_CHECK_INTERVAL:
+            return _replica_state["healthy"]
+        try:
+            with read_engine.connect() as connection:
+                lag = connection.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                )).scalar()
+            healthy = float(lag) <= REPLICA_MAX_LAG_SECONDS
+        except Exception:
+            healthy = False
+        _replica_state.update(checked_at=time.monotonic(), healthy=healthy)
+        return healthy
+
+def wrote_recently(request: Request):
+    """Check the read-your-writes cookie set after the client's last write"""
+    value = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    if not value:
+        return False
+    try:
+        return time.time() - float(value) < READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
+def mark_write(response):
+    """Pin the client to the primary for reads right after a write"""
+    if read_engine is None:
+        return
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        str(time.time()),
+        max_age=int(READ_YOUR_WRITES_SECONDS),
+        httponly=True,
+        samesite="lax",
+    )
+
+def reads_primary(db) -> bool:
+    """Whether a session from get_read_db reads from the primary
+    
+    Only such reads may fill shared caches: a lagging replica would put
+    back a value a write just invalidated, for every reader to get.
+    """
+    return read_engine is None or db.get_bind() is not read_engine
+
+def get_read_db(request: Request):
+    """Yield a session for read-only routes, preferring the replica"""
+    if ReadSessionLocal is not None and not wrote_recently(request) and replica_is_fresh():
+        db = ReadSessionLocal()
+    else:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,209 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+import sqlalchemy as sa
+from alembic import op
+
+# Helpers for Alembic revisions that must not block the running application.
+# Index builds use CONCURRENTLY on PostgreSQL, and data changes are applied
+# in small committed batches that wait only briefly for locks.
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+# Pause between batches so replicas and regular traffic keep up
+MIGRATION_BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", "0.05"))
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+MIGRATION_LOCK_ATTEMPTS = int(os.getenv("MIGRATION_LOCK_ATTEMPTS", "10"))
+MIGRATION_PROGRESS_INTERVAL = float(os.getenv("MIGRATION_PROGRESS_INTERVAL", "10"))
+
+# Last committed key of each unfinished batched run, so an interrupted
+# migration resumes where it stopped
+PROGRESS_TABLE = "migration_progress"
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+@contextmanager
+def autocommit():
+    """Run the block outside the migration's transaction
+    
+    Like MigrationContext.autocommit_block, but can be nested.
+    """
+    if op.get_bind().get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+        yield
+        return
+    with op.get_context().autocommit_block():
+        yield
+
+def _lock_unavailable(error: sa.exc.OperationalError) -> bool:
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    return code == "55P03" or "database is locked" in str(error.orig)
+
+def run_in_transaction(work: Callable, lock_timeout: Optional[str] = None, attempts: Optional[int] = None):
+    """Call work() in a transaction of its own that waits at most lock_timeout for locks
+    
+    A transaction that cannot get its locks in time is rolled back and
+    retried, so the migration never holds up requests queued behind it
+    for longer than lock_timeout. Returns what work() returns.
+    """
+    lock_timeout = lock_timeout or MIGRATION_LOCK_TIMEOUT
+    attempts = attempts or MIGRATION_LOCK_ATTEMPTS
+    with autocommit():
+        for attempt in range(1, attempts + 1):
+            op.execute("BEGIN")
+            try:
+                if _is_postgresql():
+                    op.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+                result = work()
+                op.execute("COMMIT")
+                return result
+            except sa.exc.OperationalError as e:
+                op.execute("ROLLBACK")
+                if attempt == attempts or not _lock_unavailable(e):
+                    raise
+                logger.info("Lock not available, retrying (attempt %d of %d)", attempt, attempts)
+                time.sleep(attempt)
+            except Exception:
+                op.execute("ROLLBACK")
+                raise
+
+def _partitions(table_name: str) -> list:
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT pg_class.relname FROM pg_inherits JOIN pg_class ON pg_class.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:table AS regclass) ORDER BY pg_class.relname"
+        ),
+        {"table": table_name},
+    ).scalars().all()
+
+def create_index_concurrently(index_name: str, table_name: str, columns, **kw):
+    """op.create_index that keeps the table writable on PostgreSQL
+    
+    Safe to rerun: an invalid index left behind by an interrupted build is
+    dropped and built again, and a valid one is kept. Partitioned tables
+    cannot be indexed concurrently, so each partition is; the index on the
+    partitioned table then only attaches the partition indexes.
+    """
+    if not _is_postgresql():
+        op.create_index(index_name, table_name, columns, **kw)
+        return
+    with autocommit():
+        partitions = _partitions(table_name)
+        if partitions:
+            for partition in partitions:
+                create_index_concurrently(f"{index_name}_{partition}", partition, columns, **kw)
+            run_in_transaction(lambda: op.create_index(index_name, table_name, columns, if_not_exists=True, **kw))
+            return
+        invalid = op.get_bind().execute(
+            sa.text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ),
+            {"name": index_name},
+        ).first()
+        if invalid:
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+        op.create_index(
+            index_name, table_name, columns, postgresql_concurrently=True, if_not_exists=True, **kw
+        )
+
+def drop_index_concurrently(index_name: str, table_name: str):
+    """op.drop_index that does not block reads and writes on PostgreSQL
+    
+    Indexes on partitioned tables cannot be dropped concurrently; they are
+    dropped with the partition indexes in one transaction that waits at
+    most MIGRATION_LOCK_TIMEOUT for its locks.
+    """
+    if not _is_postgresql():
+        op.drop_index(index_name, table_name=table_name)
+        return
+    with autocommit():
+        if _partitions(table_name):
+            run_in_transaction(lambda: op.drop_index(index_name, table_name=table_name, if_exists=True))
+            return
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+
+def _progress_table() -> sa.Table:
+    return sa.table(PROGRESS_TABLE, sa.column("name", sa.String), sa.column("last_key", sa.BigInteger))
+
+def run_batched(name: str, table_name: str, statement: str, key: str = "id",
+                batch_size: Optional[int] = None, pause: Optional[float] = None) -> int:
+    """Run statement over table_name in batches of keys, committing each batch
+    
+    statement is run once per batch with :low and :high bound to the key
+    range of the batch and must only touch rows with low < key <= high.
+    Rows created after the run started are not visited, so the application
+    has to write them correctly by then. Progress is checkpointed under
+    name; rerunning the migration after an interruption continues after the
+    last committed batch. Returns the number of rows affected.
+    """
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    pause = MIGRATION_BATCH_PAUSE if pause is None else pause
+    bind = op.get_bind()
+    progress = _progress_table()
+    with autocommit():
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} "
+            "(name VARCHAR(255) PRIMARY KEY, last_key BIGINT NOT NULL)"
+        )
+        bounds = bind.execute(sa.text(f"SELECT min({key}), max({key}) FROM {table_name}")).first()
+        checkpoint = bind.execute(sa.select(progress.c.last_key).where(progress.c.name == name)).scalar()
+        if checkpoint is not None:
+            logger.info("%s: resuming after %s = %d", name, key, checkpoint)
+        first, last = bounds
+        low = checkpoint if checkpoint is not None else (first - 1 if first is not None else None)
+        next_high = sa.text(
+            f"SELECT max({key}) FROM (SELECT {key} FROM {table_name} "
+            f"WHERE {key} > :low AND {key} <= :last ORDER BY {key} LIMIT :limit) AS batch"
+        )
+        
+        rows = 0
+        started = reported = time.monotonic()
+        while low is not None and low < last:
+            high = bind.execute(next_high, {"low": low, "last": last, "limit": batch_size}).scalar()
+            if high is None:
+                break
+            
+            def run_batch():
+                result = bind.execute(sa.text(statement), {"low": low, "high": high})
+                updated = bind.execute(progress.update().where(progress.c.name == name).values(last_key=high))
+                if updated.rowcount == 0:
+                    bind.execute(progress.insert().values(name=name, last_key=high))
+                return result.rowcount
+            
+            rows += max(run_in_transaction(run_batch), 0)
+            low = high
+            if time.monotonic() - reported >= MIGRATION_PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                logger.info(
+                    "%s: %d rows, %.0f%% of %s range, %.0f rows/s",
+                    name, rows, 100 * (low - first + 1) / (last - first + 1), key, rows / (reported - started),
+                )
+            if pause:
+                time.sleep(pause)
+        
+        bind.execute(progress.delete().where(progress.c.name == name))
+        if bind.execute(sa.select(sa.func.count()).select_from(progress)).scalar() == 0:
+            op.execute(f"DROP TABLE {PROGRESS_TABLE}")
+        logger.info("%s: done, %d rows in %.1fs", name, rows, time.monotonic() - started)
+    return rows
+
+def backfill(table_name: str, values: str, where: Optional[str] = None, name: Optional[str] = None,
+             key: str = "id", **kw) -> int:
+    """UPDATE table_name SET values [WHERE where] in resumable, throttled batches
+    
+    Use instead of a single UPDATE, which would lock every row of a large
+    table until it finishes, e.g.
+        
+        backfill("notes", "snippet = substr(content, 1, 200)", where="snippet IS NULL")
+    
+    Keep the backfill in a revision of its own, after the one adding the
+    column, so a rerun after an interruption only repeats the backfill.
+    """
+    statement = f"UPDATE {table_name} SET {values} WHERE {key} > :low AND {key} <= :high"
+    if where:
+        statement += f" AND ({where})"
+    return run_batched(name or f"backfill {table_name}: {values}"[:255], table_name, statement, key=key, **kw)
@@ -0,0 +1,158 @@
+from sqlalchemy import DDL, event, text
+from app.models.models import Folder, Note
+
+# SQLite: an external-content FTS5 table kept in sync with notes by triggers.
+# Batch migrations rebuild the notes table, which drops its triggers, so
+# they have to be recreated afterwards.
+SQLITE_FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "title, content, content='notes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    *SQLITE_FTS_TRIGGERS,
+]
+
+# PostgreSQL: a GIN expression index matching the search query below
+POSTGRES_FTS_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_notes_fulltext ON notes "
+    "USING gin (to_tsvector('simple', title || ' ' || content))",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Note.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_FTS_DDL:
+    event.listen(Note.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(Note.__table__, "before_drop", DDL("DROP TABLE IF EXISTS notes_fts").execute_if(dialect="sqlite"))
+
+# PostgreSQL with pg_trgm: trigram indexes for fuzzy title matching. The
+# extension is optional, and autocomplete falls back to LIKE without it.
+TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_notes_title_trgm ON notes USING gin (title gin_trgm_ops) WHERE NOT is_deleted",
+    "CREATE INDEX IF NOT EXISTS ix_folders_name_trgm ON folders USING gin (name gin_trgm_ops)",
+]
+
+def trigram_installable(bind) -> bool:
+    return bind.dialect.name == "postgresql" and bind.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first() is not None
+
+# Folders are created before notes, so both indexes hang off the notes table
+for statement in TRIGRAM_DDL:
+    event.listen(
+        Note.__table__,
+        "after_create",
+        DDL(statement).execute_if(callable_=lambda ddl, target, bind, **kw: trigram_installable(bind)),
+    )
+
+SQLITE_SEARCH = text(
+    "SELECT notes.* FROM notes JOIN notes_fts ON notes_fts.rowid = notes.id "
+    "WHERE notes_fts MATCH :query AND notes.owner_id = :owner_id AND notes.is_deleted = 0 "
+    "ORDER BY notes_fts.rank LIMIT :limit"
+)
+
+POSTGRES_SEARCH = text(
+    "SELECT notes.* FROM notes, plainto_tsquery('simple', :query) AS query "
+    "WHERE to_tsvector('simple', title || ' ' || content) @@ query "
+    "AND notes.owner_id = :owner_id AND NOT notes.is_deleted "
+    "ORDER BY ts_rank(to_tsvector('simple', title || ' ' || content), query) DESC LIMIT :limit"
+)
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input cannot use FTS5 query syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+def search_notes(db, owner_id: int, query: str, limit: int = 20):
+    """Full-text search over an owner's live notes, best matches first"""
+    if not query.strip():
+        return []
+    if db.get_bind().dialect.name == "sqlite":
+        statement, params = SQLITE_SEARCH, {"query": _fts5_query(query), "limit": limit}
+    else:
+        statement, params = POSTGRES_SEARCH, {"query": query, "limit": limit}
+    return db.query(Note).from_statement(statement).params(**params, owner_id=owner_id).all()
+
+TRIGRAM_AUTOCOMPLETE = text(
+    "SELECT * FROM ("
+    "SELECT 'note' AS type, id, title, word_similarity(:query, title) AS score FROM notes "
+    "WHERE owner_id = :owner_id AND NOT is_deleted AND (:query <% title OR title ILIKE :pattern ESCAPE '\\') "
+    "UNION ALL "
+    "SELECT 'folder', id, name, word_similarity(:query, name) FROM folders "
+    "WHERE owner_id = :owner_id AND (:query <% name OR name ILIKE :pattern ESCAPE '\\')"
+    ") AS matches ORDER BY score DESC, title LIMIT :limit"
+)
+
+_trigram_enabled = {}
+
+def _uses_trigrams(db) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _trigram_enabled:
+        _trigram_enabled[key] = bind.dialect.name == "postgresql" and db.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _trigram_enabled[key]
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _similarity(query: str, title: str) -> float:
+    # Rough stand-in for word_similarity: prefix, then word start, then substring
+    title = title.lower()
+    if title.startswith(query):
+        return 1.0
+    if any(word.startswith(query) for word in title.split()):
+        return 0.9
+    return round(0.5 + 0.4 * len(query) / len(title), 4)
+
+def autocomplete(db, owner_id: int, query: str, limit: int = 10):
+    """Fuzzy-match an owner's note titles and folder names, best matches first
+    
+    Uses pg_trgm word similarity when the extension is installed and a
+    substring match scored in Python otherwise.
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+    pattern = _like_pattern(query)
+    if _uses_trigrams(db):
+        rows = db.execute(
+            TRIGRAM_AUTOCOMPLETE, {"owner_id": owner_id, "query": query, "pattern": pattern, "limit": limit}
+        )
+        return [{"type": row.type, "id": row.id, "title": row.title, "score": round(row.score, 4)} for row in rows]
+    
+    # Without trigram support only substring matches are found
+    candidates = [
+        ("note", row.id, row.title)
+        for row in db.query(Note.id, Note.title)
+        .filter(Note.owner_id == owner_id, Note.is_deleted == False, Note.title.ilike(pattern, escape="\\"))
+        .limit(limit * 5)
+    ] + [
+        ("folder", row.id, row.name)
+        for row in db.query(Folder.id, Folder.name)
+        .filter(Folder.owner_id == owner_id, Folder.name.ilike(pattern, escape="\\"))
+        .limit(limit * 5)
+    ]
+    matches = [
+        {"type": kind, "id": item_id, "title": title, "score": _similarity(query, title)}
+        for kind, item_id, title in candidates
+    ]
+    matches.sort(key=lambda match: (-match["score"], match["title"]))
+    return matches[:limit]
+
+def rebuild_search_index(engine):
+    """Rebuild the full-text index from the notes table"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+        elif conn.dialect.name == "postgresql":
+            # CONCURRENTLY keeps the notes table writable while the index is rebuilt
+            conn.execute(text("REINDEX INDEX CONCURRENTLY ix_notes_fulltext"))
@@ -0,0 +1,227 @@
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged and counted; 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Share of slow SELECTs re-run under EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+# A statement is explained at most once per interval
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+SLOW_QUERY_EXPLAIN_TIMEOUT = os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT", "10s")
+# Distinct statements tracked per worker; the least expensive are dropped first
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "200"))
+
+MAX_PARAMETER_LENGTH = 100
+
+# ASGI scope of the request being served, for naming the route behind a statement
+current_request: ContextVar[Optional[dict]] = ContextVar("current_request", default=None)
+
+class QueryContextMiddleware:
+    """ASGI middleware making the current request visible to engine events"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+
+def current_route() -> Optional[str]:
+    """Method and route template of the request being served, if any"""
+    scope = current_request.get()
+    if scope is None:
+        return None
+    # The router adds the matched route to the scope it was handed
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+# Bind parameter styles of the drivers in use, with psycopg 3's type casts
+_PLACEHOLDER = r"(?:%\(\w+\)s|%s|\?|\$\d+|:\w+)(?:::\w+(?:\[\])?)?"
+
+def normalize(statement: str) -> str:
+    """Statement text with literals and expanded IN lists collapsed, for grouping"""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"(?<![\w$])\d+(?:\.\d+)?\b", "?", statement)
+    return re.sub(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)", "(...)", statement)
+
+def _short(value) -> str:
+    value = repr(value)
+    if len(value) > MAX_PARAMETER_LENGTH:
+        return value[:MAX_PARAMETER_LENGTH] + f"... ({len(value)} chars)"
+    return value
+
+def format_parameters(parameters, executemany: bool = False):
+    """Parameters with long values cut short; executemany shows its first row"""
+    if executemany and parameters:
+        return {"first": format_parameters(parameters[0]), "rows": len(parameters)}
+    if isinstance(parameters, dict):
+        return {name: _short(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_short(value) for value in parameters]
+    return parameters
+
+_UNSAFE_TO_ANALYZE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|FOR (NO KEY )?UPDATE|FOR (KEY )?SHARE|pg_notify|set_config|nextval|setval|pg_advisory\w*)\b",
+    re.IGNORECASE,
+)
+
+def explainable(statement: str) -> bool:
+    """Whether EXPLAIN ANALYZE, which runs the statement, is free of side effects"""
+    return statement.lstrip().upper().startswith(("SELECT", "WITH")) and not _UNSAFE_TO_ANALYZE.search(statement)
+
+class SlowQueryLog:
+    """Per-worker statistics of slow statements, grouped by normalized text"""
+    
+    def __init__(self, max_statements: int = SLOW_QUERY_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def record(self, statement: str, duration_ms: float, route: Optional[str], parameters,
+               want_plan: bool = False) -> bool:
+        """Count one slow execution; returns whether to capture a plan the caller wants"""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            entry = self._entries.get(statement)
+            if entry is None:
+                if len(self._entries) >= self.max_statements:
+                    cheapest = min(self._entries, key=lambda key: self._entries[key]["total_ms"])
+                    del self._entries[cheapest]
+                entry = self._entries[statement] = {
+                    "statement": statement, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": {},
+                    "last_ms": 0.0, "last_parameters": None, "last_seen": now,
+                    "plan": None, "plan_captured_at": None, "explain_due": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_ms"] = duration_ms
+            entry["last_parameters"] = parameters
+            entry["last_seen"] = now
+            route = route or "background"
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+            if not want_plan or time.monotonic() < entry["explain_due"]:
+                return False
+            entry["explain_due"] = time.monotonic() + SLOW_QUERY_EXPLAIN_INTERVAL
+            return True
+    
+    def set_plan(self, statement: str, plan: str):
+        with self._lock:
+            entry = self._entries.get(statement)
+            if entry is not None:
+                entry["plan"] = plan
+                entry["plan_captured_at"] = datetime.now(timezone.utc)
+    
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> list:
+        with self._lock:
+            entries = [
+                {**entry, "routes": dict(entry["routes"]), "mean_ms": entry["total_ms"] / entry["count"]}
+                for entry in self._entries.values()
+            ]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        return entries[:limit]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+slow_query_log = SlowQueryLog()
+
+class Explainer:
+    """Run sampled EXPLAIN (ANALYZE, BUFFERS) on a connection of its own in the background
+    
+    Requests are never held up by an EXPLAIN; when the queue is full the
+    plan is simply not captured.
+    """
+    
+    def __init__(self, log: SlowQueryLog, max_queued: int = 10):
+        self.log = log
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, engine, normalized: str, statement: str, parameters):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait((engine, normalized, statement, parameters))
+        except queue.Full:
+            pass
+    
+    def _run(self):
+        while True:
+            engine, normalized, statement, parameters = self._queue.get()
+            try:
+                with engine.connect().execution_options(slow_query_log=False) as connection:
+                    connection.execute(
+                        text("SELECT set_config('statement_timeout', :timeout, true)"),
+                        {"timeout": SLOW_QUERY_EXPLAIN_TIMEOUT},
+                    )
+                    rows = connection.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+                    self.log.set_plan(normalized, "\n".join(row[0] for row in rows))
+                    connection.rollback()
+            except Exception as e:
+                logger.info("Could not explain slow query: %s", e)
+            finally:
+                self._queue.task_done()
+    
+    def wait(self):
+        """Block until every queued EXPLAIN has run"""
+        self._queue.join()
+
+explainer = Explainer(slow_query_log)
+
+def instrument(engine):
+    """Time every statement run through engine and log the slow ones"""
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(exception_context):
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        if SLOW_QUERY_MS <= 0 or duration_ms < SLOW_QUERY_MS or not conn.get_execution_options().get(
+            "slow_query_log", True
+        ):
+            return
+        normalized = normalize(statement)
+        route = current_route()
+        shown_parameters = format_parameters(parameters, executemany)
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s; parameters %s",
+            duration_ms, route or "background", normalized, shown_parameters,
+        )
+        want_plan = (
+            not executemany and conn.dialect.name == "postgresql" and explainable(statement)
+            and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE
+        )
+        if slow_query_log.record(normalized, duration_ms, route, shown_parameters, want_plan):
+            explainer.submit(conn.engine, normalized, statement, parameters)
@@ -0,0 +1,43 @@
+from typing import List
+from sqlalchemy import DDL, distinct, event, func, literal, select, text
+from app.models.models import Note
+
+# PostgreSQL: a GIN index over the tag arrays of live notes, which serves
+# both @> (all tags) and && (any tag). Without fastupdate every write goes
+# straight into the index, so reads never scan a backlog of pending
+# entries. SQLite installs are small enough to filter with json_each.
+POSTGRES_TAG_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_notes_tags ON notes USING gin (tags) WITH (fastupdate = off) WHERE NOT is_deleted",
+]
+
+for statement in POSTGRES_TAG_DDL:
+    event.listen(Note.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+POSTGRES_TAG_COUNTS = text(
+    "SELECT tag, count(*) AS count FROM notes, unnest(notes.tags) AS tag "
+    "WHERE notes.owner_id = :owner_id AND NOT notes.is_deleted "
+    "GROUP BY tag ORDER BY count DESC, tag LIMIT :limit"
+)
+
+SQLITE_TAG_COUNTS = text(
+    "SELECT tags.value AS tag, count(*) AS count FROM notes, json_each(notes.tags) AS tags "
+    "WHERE notes.owner_id = :owner_id AND notes.is_deleted = 0 "
+    "GROUP BY tags.value ORDER BY count DESC, tag LIMIT :limit"
+)
+
+def tag_filter(db, tags: List[str], match_all: bool = True):
+    """Condition on Note matching all or any of tags"""
+    if db.get_bind().dialect.name != "sqlite":
+        return Note.tags.contains(tags) if match_all else Note.tags.overlap(tags)
+    values = func.json_each(Note.tags).table_valued("value")
+    if match_all:
+        return select(func.count(distinct(values.c.value))).where(values.c.value.in_(tags)).scalar_subquery() == len(tags)
+    return select(literal(1)).select_from(values).where(values.c.value.in_(tags)).exists()
+
+def tag_counts(db, owner_id: int, limit: int = 100):
+    """An owner's tags with the number of live notes carrying each, most used first"""
+    statement = SQLITE_TAG_COUNTS if db.get_bind().dialect.name == "sqlite" else POSTGRES_TAG_COUNTS
+    return [
+        {"tag": row.tag, "count": row.count}
+        for row in db.execute(statement, {"owner_id": owner_id, "limit": limit})
+    ]
@@ -1,12 +1,26 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import folders, notes
-from app.database.connection import engine, Base
+from app.routers import folders, notes, batch, events, blobs, autocomplete, export, jobs, admin
+from app.database.connection import mark_write
+from app.database.slow_queries import QueryContextMiddleware
+from app.services.purge import start_purge_worker, stop_purge_worker
+from app.services.events import broker
+from app.services.admission import admission_control
+from app.services.jobs import runner
+from app.services.capture import TrafficCaptureMiddleware, stop_capture
+from app.services.idempotency import IdempotencyMiddleware
+from app.services.health import InFlightMiddleware, readiness
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+app = FastAPI(
+    title="MyNotes API",
+    description="API for the MyNotes application",
+    version="1.0.0",
+    dependencies=[Depends(admission_control)],
+)
 
-app = FastAPI(title="MyNotes API", description="API for the MyNotes application", version="1.0.0")
+# Innermost, so CORS and read-your-writes headers are set afresh on replayed responses
+app.add_middleware(IdempotencyMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -17,18 +31,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Route a client's reads to the primary for a short window after it writes"""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_write(response)
+    return response
+
+# Lets the slow query log name the route that ran a statement
+app.add_middleware(QueryContextMiddleware)
+
+# Counts requests in flight for the readiness check
+app.add_middleware(InFlightMiddleware)
+
+# Added last so it is outermost and times the whole request
+app.add_middleware(TrafficCaptureMiddleware)
+
+@app.on_event("startup")
+def start_background_jobs():
+    start_purge_worker()
+    runner.recover()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    stop_purge_worker()
+    broker.stop()
+    runner.stop()
+    stop_capture()
+
 # Include routers
 app.include_router(folders.router, prefix="/api")
 app.include_router(notes.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
+app.include_router(events.router, prefix="/api")
+app.include_router(blobs.router, prefix="/api")
+app.include_router(autocomplete.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.get("/")
 def root():
     return {"message": "MyNotes API is running"}
 
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
+    """Liveness: the process is up and serving, whatever the state of the database"""
     return {"status": "healthy"}
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: the database answers within READINESS_DB_TIMEOUT_MS and the pool is not saturated"""
+    ready, report = await readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,33 +1,177 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Text, DateTime, ForeignKeyConstraint, Boolean, Index, JSON,
+    LargeBinary, UniqueConstraint, text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.connection import Base
 
+# A text array on PostgreSQL, GIN-indexed by app.database.tags; SQLite has
+# no arrays and keeps the list as JSON
+TagList = ARRAY(String(50)).with_variant(JSON(), "sqlite")
+
 class Folder(Base):
     __tablename__ = "folders"
     
     id = Column(Integer, primary_key=True, index=True)
+    # Rows written before owners existed belong to the default owner
+    owner_id = Column(Integer, nullable=False, server_default="1")
     name = Column(String(255), nullable=False)
     icon = Column(String(10), default="📁")
-    parent_id = Column(Integer, ForeignKey("folders.id"), nullable=True)
+    parent_id = Column(Integer, nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
-    # Relationships
-    parent = relationship("Folder", remote_side=[id])
-    subfolders = relationship("Folder", back_populates="parent")
-    notes = relationship("Note", back_populates="folder")
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        UniqueConstraint("id", "owner_id", name="uq_folders_id_owner"),
+        # Including the owner in the key keeps a folder from being moved under someone else's
+        ForeignKeyConstraint(["parent_id", "owner_id"], ["folders.id", "folders.owner_id"], name="fk_folders_parent_owner"),
+        Index("ix_folders_owner_parent", "owner_id", "parent_id"),
+    )
+    
+    # Relationships; they join on the folder ID alone, so detaching a child never clears its owner
+    parent = relationship("Folder", remote_side=[id], primaryjoin="Folder.id == foreign(Folder.parent_id)")
+    subfolders = relationship("Folder", back_populates="parent", primaryjoin="Folder.id == foreign(Folder.parent_id)")
+    notes = relationship("Note", back_populates="folder", primaryjoin="Folder.id == foreign(Note.folder_id)")
 
 class Note(Base):
     __tablename__ = "notes"
     
     id = Column(Integer, primary_key=True, index=True)
+    # Migrated PostgreSQL databases hash-partition notes on owner_id, with
+    # (id, owner_id) as the primary key; see the add_owners migration
+    owner_id = Column(Integer, nullable=False, server_default="1")
     title = Column(String(500), nullable=False, default="Unbenannt")
     content = Column(Text, nullable=False, default="")
-    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=True)
+    folder_id = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
     is_deleted = Column(Boolean, default=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Large notes keep their content in note_chunks and leave content empty
+    is_chunked = Column(Boolean, nullable=False, default=False, server_default=text("false"))
+    tags = Column(TagList, nullable=False, default=list)
+    
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        UniqueConstraint("id", "owner_id", name="uq_notes_id_owner"),
+        ForeignKeyConstraint(["folder_id", "owner_id"], ["folders.id", "folders.owner_id"], name="fk_notes_folder_owner"),
+        # Lets the purge job find expired tombstones without scanning live notes
+        Index(
+            "ix_notes_trash",
+            "deleted_at",
+            postgresql_where=text("is_deleted"),
+            sqlite_where=text("is_deleted"),
+        ),
+        # Serves the recent feed; each dialect needs the predicate spelled the way its queries are
+        Index(
+            "ix_notes_recent",
+            "owner_id",
+            "updated_at",
+            "id",
+            postgresql_where=text("NOT is_deleted"),
+            sqlite_where=text("is_deleted = 0"),
+        ),
+        # Folder listings, including subtree joins, in feed order
+        Index(
+            "ix_notes_folder_recent",
+            "folder_id",
+            "updated_at",
+            "id",
+            postgresql_where=text("NOT is_deleted"),
+            sqlite_where=text("is_deleted = 0"),
+        ),
+    )
     
     # Relationships
-    folder = relationship("Folder", back_populates="notes")
\ No newline at end of file
+    folder = relationship("Folder", back_populates="notes", primaryjoin="Folder.id == foreign(Note.folder_id)")
+    chunks = relationship(
+        "NoteChunk", order_by="NoteChunk.seq", cascade="all, delete-orphan", passive_deletes=True
+    )
+    
+    @property
+    def full_content(self) -> str:
+        if not self.is_chunked:
+            return self.content
+        return "".join(chunk.data for chunk in self.chunks)
+
+class NoteChunk(Base):
+    __tablename__ = "note_chunks"
+    
+    note_id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, nullable=False, server_default="1")
+    # Sparse ordering key, so chunks can be inserted between neighbours
+    seq = Column(BigInteger, primary_key=True)
+    # Length of data in UTF-8 bytes, for serving byte ranges
+    size = Column(Integer, nullable=False)
+    data = Column(Text, nullable=False)
+    
+    __table_args__ = (
+        # Partitioned tables only have unique keys that include the partition key
+        ForeignKeyConstraint(
+            ["note_id", "owner_id"], ["notes.id", "notes.owner_id"], ondelete="CASCADE", name="fk_note_chunks_note_owner"
+        ),
+    )
+
+class NoteRevision(Base):
+    __tablename__ = "note_revisions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    note_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False, server_default="1")
+    version = Column(Integer, nullable=False)
+    title = Column(String(500), nullable=False)
+    # Full content for snapshots, a reverse delta against the next version otherwise
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("note_id", "version", name="uq_note_revisions_note_version"),
+        ForeignKeyConstraint(
+            ["note_id", "owner_id"], ["notes.id", "notes.owner_id"], ondelete="CASCADE", name="fk_note_revisions_note_owner"
+        ),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # None for maintenance jobs that are not run on behalf of a user
+    owner_id = Column(Integer, nullable=True, index=True)
+    kind = Column(String(50), nullable=False)
+    # queued, running, succeeded, failed or cancelled
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    params = Column(Text, nullable=False, default="{}")
+    progress_done = Column(Integer, nullable=False, default=0)
+    progress_total = Column(Integer, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped with every progress update so stalled jobs can be detected
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, nullable=False)
+    key = Column(String(255), nullable=False)
+    # SHA-256 of the method, path and body of the request that used the key first
+    fingerprint = Column(String(64), nullable=False)
+    # None while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    __table_args__ = (
+        UniqueConstraint("owner_id", "key", name="uq_idempotency_keys_owner_key"),
+    )
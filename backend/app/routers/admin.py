@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List, Literal
+from app.database.slow_queries import slow_query_log
+from app.schemas.schemas import SlowQuery
+from app.services.owners import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/slow-queries", response_model=List[SlowQuery])
+def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: Literal["total_ms", "max_ms", "mean_ms", "count"] = "total_ms",
+):
+    """Get the statements slower than SLOW_QUERY_MS seen by this worker, worst first"""
+    return slow_query_log.top(limit, order_by)
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    """Reset this worker's slow query statistics"""
+    slow_query_log.clear()
+    return {"message": "Slow query statistics cleared"}
@@ -0,0 +1,38 @@
+import os
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List
+from app.database.connection import get_read_db
+from app.database.search import autocomplete as autocomplete_titles
+from app.schemas.schemas import AutocompleteMatch
+from app.services.cache import MemoryCache
+from app.services.owners import get_owner_id
+
+router = APIRouter(tags=["autocomplete"])
+
+# The first keystrokes of a quick switcher hit the same few prefixes over
+# and over, so short queries are answered from a per-worker cache
+PREFIX_CACHE_LENGTH = int(os.getenv("AUTOCOMPLETE_PREFIX_CACHE_LENGTH", "3"))
+prefix_cache = MemoryCache(
+    max_entries=int(os.getenv("AUTOCOMPLETE_PREFIX_CACHE_ENTRIES", "512")),
+    ttl=int(os.getenv("AUTOCOMPLETE_PREFIX_CACHE_TTL", "5")),
+)
+
+@router.get("/autocomplete", response_model=List[AutocompleteMatch])
+def autocomplete(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Fuzzy-match note titles and folder names for the quick switcher"""
+    query = q.strip().lower()
+    if len(query) > PREFIX_CACHE_LENGTH:
+        return autocomplete_titles(db, owner_id, query, limit)
+    
+    key = f"{owner_id}:{query}:{limit}"
+    matches = prefix_cache.get(key)
+    if matches is None:
+        matches = autocomplete_titles(db, owner_id, query, limit)
+        prefix_cache.set(key, matches)
+    return matches
@@ -0,0 +1,115 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app.database.connection import get_db
+from app.models.models import Folder, Note
+from app.schemas.schemas import (
+    BatchRequest, BatchResponse, BatchResult,
+    FolderCreate, FolderUpdate, Folder as FolderSchema,
+    NoteCreate, NoteUpdate, Note as NoteSchema,
+)
+from app.routers.folders import apply_folder_update, delete_folder_tree, folder_values
+from app.routers.notes import apply_note_update, soft_delete_note, note_values
+from app.services.cache import cache, note_key, folder_tree_key, tag_cloud_key
+from app.services.events import notify_changes, change
+from app.services.owners import get_owner_id
+
+router = APIRouter(tags=["batch"])
+
+def _resolve_id(value, id_map):
+    """Map a client temporary ID to the real ID created earlier in the batch"""
+    if value is None:
+        return None
+    if str(value) in id_map:
+        return id_map[str(value)]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=404, detail=f"Unknown temporary ID {value}")
+
+def _run_operation(db: Session, owner_id: int, op, id_maps, detached_notes: set) -> BatchResult:
+    """Apply one batch operation inside the caller's transaction
+    
+    Notes moved to the top level by a folder delete are added to detached_notes.
+    """
+    data = dict(op.data)
+    if "folder_id" in data:
+        data["folder_id"] = _resolve_id(data["folder_id"], id_maps["folder"])
+    if "parent_id" in data:
+        data["parent_id"] = _resolve_id(data["parent_id"], id_maps["folder"])
+    
+    if op.type == "folder":
+        model, create_schema, update_schema, response_schema = Folder, FolderCreate, FolderUpdate, FolderSchema
+        apply_update, apply_delete, create_values = apply_folder_update, delete_folder_tree, folder_values
+    else:
+        model, create_schema, update_schema, response_schema = Note, NoteCreate, NoteUpdate, NoteSchema
+        apply_update, apply_delete, create_values = apply_note_update, soft_delete_note, note_values
+    
+    if op.action == "create":
+        create = create_schema.model_validate(data)
+        db_obj = model(**create_values(db, create, owner_id))
+        db.add(db_obj)
+        db.flush()
+        if op.temp_id is not None:
+            id_maps[op.type][str(op.temp_id)] = db_obj.id
+        obj_id = db_obj.id
+    else:
+        obj_id = _resolve_id(op.id, id_maps[op.type])
+        if obj_id is None:
+            raise HTTPException(status_code=422, detail=f"{op.action} requires an id")
+        if op.action == "update":
+            update = update_schema.model_validate(data)
+            update_data = update.model_dump(exclude_unset=True, exclude={"expected_version"})
+            db_obj = apply_update(db, owner_id, obj_id, update_data, update.expected_version)
+        else:
+            deleted = apply_delete(db, owner_id, obj_id)
+            if op.type == "folder":
+                _, detached = deleted
+                detached_notes.update(detached)
+            db.flush()
+            db_obj = None
+    
+    result = BatchResult(type=op.type, action=op.action, id=obj_id, temp_id=op.temp_id)
+    if db_obj is not None:
+        setattr(result, op.type, response_schema.model_validate(db_obj))
+    return result
+
+@router.post("/batch", response_model=BatchResponse)
+def run_batch(batch: BatchRequest, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Apply an ordered list of folder and note operations in one transaction"""
+    id_maps = {"folder": {}, "note": {}}
+    results = []
+    detached_notes = set()
+    
+    for index, op in enumerate(batch.operations):
+        try:
+            results.append(_run_operation(db, owner_id, op, id_maps, detached_notes))
+        except HTTPException as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=e.status_code,
+                detail={"index": index, "detail": e.detail},
+                headers=e.headers,
+            )
+        except ValidationError as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=422,
+                detail={"index": index, "detail": e.errors(include_url=False, include_context=False)},
+            )
+    
+    notify_changes(db, owner_id, [
+        change(r.type, r.action, r.id, getattr(r, r.type).version if getattr(r, r.type) else None)
+        for r in results
+    ])
+    db.commit()
+    
+    stale_keys = {note_key(owner_id, r.id) for r in results if r.type == "note" and r.action != "create"}
+    stale_keys.update(note_key(owner_id, note_id) for note_id in detached_notes)
+    if any(r.type == "folder" for r in results):
+        stale_keys.add(folder_tree_key(owner_id))
+    if any(r.type == "note" for r in results):
+        stale_keys.add(tag_cloud_key(owner_id))
+    cache.delete(*stale_keys)
+    
+    return BatchResponse(results=results, id_map=id_maps)
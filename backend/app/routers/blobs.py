@@ -0,0 +1,91 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse
+from app.services.blobs import IMAGE_TYPES, blob_path, blob_content_type
+
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+CHUNK_SIZE = 64 * 1024
+
+# Sent with every blob response: browsers may neither sniff a blob into a
+# scriptable type nor run anything in it, whatever type it was stored with
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "default-src 'none'; sandbox",
+}
+
+def parse_range(range_header: str, size: int):
+    """Parse a single "bytes=start-end" range; returns None if it cannot be satisfied"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+def _read_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@router.get("/{blob_id}")
+def get_blob(
+    blob_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Serve a stored blob with immutable cache headers and byte-range support"""
+    content_type = blob_content_type(blob_id)
+    if content_type is None:
+        raise HTTPException(status_code=404, detail="Blob not found", headers=SECURITY_HEADERS)
+    
+    # Blobs are content-addressed, so the hash is a permanent validator
+    headers = {
+        **SECURITY_HEADERS,
+        "ETag": f'"{blob_id}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if content_type not in IMAGE_TYPES:
+        # Stored before extraction was limited to raster images
+        headers["Content-Disposition"] = "attachment"
+    if if_none_match is not None and blob_id in if_none_match:
+        return Response(status_code=304, headers=headers)
+    
+    path = blob_path(blob_id)
+    size = os.path.getsize(path)
+    if range_header is not None:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={**SECURITY_HEADERS, "Content-Range": f"bytes */{size}"},
+            )
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _read_file(path, start, end - start + 1), status_code=206, media_type=content_type, headers=headers
+        )
+    
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_read_file(path, 0, size), media_type=content_type, headers=headers)
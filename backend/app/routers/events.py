@@ -0,0 +1,38 @@
+import asyncio
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.services.events import broker, RESYNC
+from app.services.owners import get_owner_id
+
+router = APIRouter(tags=["events"])
+
+HEARTBEAT_SECONDS = 15
+
+@router.get("/events")
+async def stream_events(request: Request, owner_id: int = Depends(get_owner_id)):
+    """Stream note and folder changes as Server-Sent Events"""
+    async def event_stream():
+        queue = broker.subscribe(owner_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if payload == RESYNC:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    yield f"event: change\ndata: {payload}\n\n"
+        finally:
+            broker.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
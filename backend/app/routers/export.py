@@ -0,0 +1,51 @@
+import json
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database.connection import get_db
+from app.models.models import Folder, Note
+from app.schemas.schemas import FolderSummary, Note as NoteSchema
+from app.services.jobs import job_handler, runner, accepted, write_result_file
+from app.services.owners import get_owner_id
+
+router = APIRouter(tags=["export"])
+
+# Notes loaded per round trip while an export is written
+EXPORT_BATCH_SIZE = 200
+
+@job_handler("export")
+def export_job(ctx):
+    """Write the owner's folders and live notes to a JSON document for the owner to download"""
+    with ctx.session_factory() as db:
+        folders = [
+            FolderSummary.model_validate(folder).model_dump(mode="json")
+            for folder in db.query(Folder).filter(Folder.owner_id == ctx.owner_id).order_by(Folder.id)
+        ]
+        live_notes = db.query(Note).filter(Note.owner_id == ctx.owner_id, Note.is_deleted == False)
+        total = live_notes.count()
+        ctx.progress(0, total)
+        
+        notes = []
+        last_id = 0
+        while True:
+            # Keyset pagination keeps each batch an index range scan
+            batch = (
+                live_notes
+                .filter(Note.id > last_id)
+                .order_by(Note.id)
+                .limit(EXPORT_BATCH_SIZE)
+                .all()
+            )
+            if not batch:
+                break
+            notes.extend(NoteSchema.model_validate(note).model_dump(mode="json") for note in batch)
+            last_id = batch[-1].id
+            db.expunge_all()
+            ctx.progress(len(notes), total)
+    
+    url = write_result_file(ctx.job_id, json.dumps({"folders": folders, "notes": notes}).encode())
+    return {"url": url, "filename": f"export-{ctx.job_id}.json", "folders": len(folders), "notes": len(notes)}
+
+@router.post("/export", status_code=202)
+def export_notes(db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Export all folders and notes as JSON in the background"""
+    return accepted(runner.submit(db, "export", {}, owner_id))
@@ -1,63 +1,264 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database.connection import get_db
-from app.models.models import Folder
-from app.schemas.schemas import FolderCreate, FolderUpdate, Folder as FolderSchema
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import update, delete, select, func
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional, Tuple
+from app.database.connection import get_db, get_read_db, reads_primary, wrote_recently
+from app.models.models import Folder, Note
+from app.schemas.schemas import FolderCreate, FolderUpdate, FolderMove, FolderSummary, Folder as FolderSchema
+from app.services.concurrency import resolve_expected_version, etag, version_conflict
+from app.services.cache import cache, folder_tree_key, note_key
+from app.services.events import notify_changes, change
+from app.services.jobs import job_handler, runner, wants_async, accepted
+from app.services.owners import get_owner_id
+from app.services.streaming import json_array_response
 
 router = APIRouter(prefix="/folders", tags=["folders"])
 
+# Serializes re-parenting on Postgres, where two concurrent moves could each
+# pass the cycle check and together form a loop
+MOVE_LOCK_KEY = 0x6d6f7665
+# Folders removed per transaction when a subtree is deleted as a job
+DELETE_BATCH_SIZE = 500
+
+folder_tree_adapter = TypeAdapter(List[FolderSchema])
+
 @router.get("/", response_model=List[FolderSchema])
-def get_folders(db: Session = Depends(get_db)):
-    """Get all folders with their hierarchy"""
-    folders = db.query(Folder).filter(Folder.parent_id.is_(None)).all()
-    return folders
+def get_folders(
+    request: Request, stream: bool = False, db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)
+):
+    """Get all folders with their hierarchy
+    
+    With stream, top-level folders and their subtrees are sent as they are
+    read; a streamed tree is not cached.
+    """
+    # Writers skip the cache for the read-your-writes window, as reads_primary explains
+    cached = None if wrote_recently(request) else cache.get(folder_tree_key(owner_id))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    if stream:
+        return json_array_response(
+            db, select(Folder).where(Folder.owner_id == owner_id, Folder.parent_id.is_(None)), FolderSchema,
+        )
+    
+    folders = db.query(Folder).filter(Folder.owner_id == owner_id, Folder.parent_id.is_(None)).all()
+    result = folder_tree_adapter.validate_python(folders, from_attributes=True)
+    if reads_primary(db):
+        cache.set(folder_tree_key(owner_id), folder_tree_adapter.dump_json(result).decode())
+    return result
 
 @router.get("/{folder_id}", response_model=FolderSchema)
-def get_folder(folder_id: int, db: Session = Depends(get_db)):
+def get_folder(
+    folder_id: int, response: Response, db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)
+):
     """Get a specific folder by ID"""
-    folder = db.query(Folder).filter(Folder.id == folder_id).first()
+    folder = db.query(Folder).filter(Folder.id == folder_id, Folder.owner_id == owner_id).first()
     if not folder:
         raise HTTPException(status_code=404, detail="Folder not found")
+    response.headers["ETag"] = etag(folder.version)
     return folder
 
+def require_folder(db: Session, owner_id: int, folder_id: Optional[int], detail: str = "Folder not found"):
+    """Raise 404 unless folder_id is None or one of the owner's folders"""
+    if folder_id is not None and db.query(Folder.id).filter(
+        Folder.id == folder_id, Folder.owner_id == owner_id
+    ).first() is None:
+        raise HTTPException(status_code=404, detail=detail)
+
+def require_folders(db: Session, owner_id: int, folder_ids, detail: str = "Folder not found"):
+    """require_folder for many folders in one query; None entries are ignored"""
+    wanted = {folder_id for folder_id in folder_ids if folder_id is not None}
+    if not wanted:
+        return
+    found = db.query(Folder.id).filter(Folder.id.in_(wanted), Folder.owner_id == owner_id).count()
+    if found != len(wanted):
+        raise HTTPException(status_code=404, detail=detail)
+
+def folder_values(db: Session, folder: FolderCreate, owner_id: int) -> dict:
+    """Column values for a new folder of the given owner"""
+    require_folder(db, owner_id, folder.parent_id, "Parent folder not found")
+    return {**folder.model_dump(), "owner_id": owner_id}
+
 @router.post("/", response_model=FolderSchema)
-def create_folder(folder: FolderCreate, db: Session = Depends(get_db)):
+def create_folder(folder: FolderCreate, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
     """Create a new folder"""
-    db_folder = Folder(**folder.model_dump())
+    db_folder = Folder(**folder_values(db, folder, owner_id))
     db.add(db_folder)
+    db.flush()
+    notify_changes(db, owner_id, [change("folder", "create", db_folder.id, db_folder.version)])
     db.commit()
+    cache.delete(folder_tree_key(owner_id))
     db.refresh(db_folder)
     return db_folder
 
-@router.put("/{folder_id}", response_model=FolderSchema)
-def update_folder(folder_id: int, folder_update: FolderUpdate, db: Session = Depends(get_db)):
-    """Update a folder"""
-    db_folder = db.query(Folder).filter(Folder.id == folder_id).first()
-    if not db_folder:
-        raise HTTPException(status_code=404, detail="Folder not found")
+def folder_subtree(folder_id: int, owner_id: int):
+    """Recursive CTE of the IDs of a folder and all its descendants"""
+    tree = select(Folder.id).where(Folder.id == folder_id, Folder.owner_id == owner_id).cte("subtree", recursive=True)
+    child = aliased(Folder)
+    # UNION rather than UNION ALL so a corrupted, cyclic tree still terminates
+    return tree.union(select(child.id).where(child.owner_id == owner_id, child.parent_id == tree.c.id))
+
+def apply_folder_update(
+    db: Session, owner_id: int, folder_id: int, update_data: dict, expected_version: Optional[int] = None
+) -> Folder:
+    """Run a conditional UPDATE ... RETURNING for a folder, raising 404 or 409
     
-    update_data = folder_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_folder, field, value)
+    Changing parent_id re-parents the whole subtree in the same statement,
+    which also refuses targets inside the subtree, so a move costs a
+    constant number of statements however many descendants it has.
+    """
+    stmt = (
+        update(Folder)
+        .where(Folder.id == folder_id, Folder.owner_id == owner_id)
+        .values(**update_data, version=Folder.version + 1)
+        .returning(Folder)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Folder.version == expected_version)
+    new_parent_id = update_data.get("parent_id")
+    if new_parent_id is not None:
+        require_folder(db, owner_id, new_parent_id, "Parent folder not found")
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(select(func.pg_advisory_xact_lock(MOVE_LOCK_KEY)))
+        subtree = folder_subtree(folder_id, owner_id)
+        stmt = stmt.where(~select(subtree.c.id).where(subtree.c.id == new_parent_id).exists())
     
-    db.commit()
-    db.refresh(db_folder)
+    db_folder = db.scalars(
+        stmt, execution_options={"synchronize_session": False, "populate_existing": True}
+    ).first()
+    if db_folder is None:
+        db.rollback()
+        current_version = db.query(Folder.version).filter(
+            Folder.id == folder_id, Folder.owner_id == owner_id
+        ).scalar()
+        if current_version is None:
+            raise HTTPException(status_code=404, detail="Folder not found")
+        if expected_version is not None and current_version != expected_version:
+            raise version_conflict("Folder", current_version)
+        raise HTTPException(status_code=400, detail="Cannot move a folder into itself or one of its subfolders")
     return db_folder
 
-@router.delete("/{folder_id}")
-def delete_folder(folder_id: int, db: Session = Depends(get_db)):
-    """Delete a folder and all its subfolders"""
-    db_folder = db.query(Folder).filter(Folder.id == folder_id).first()
+def detach_notes(db: Session, owner_id: int, folder_ids) -> List[int]:
+    """Move the notes of folders about to be deleted to the top level, returning the notes' IDs
+    
+    Callers drop the cached copies of these notes after committing, as
+    their folder_id changes without a version bump.
+    """
+    return db.scalars(
+        update(Note)
+        .where(Note.owner_id == owner_id, Note.folder_id.in_(folder_ids))
+        .values(folder_id=None)
+        .returning(Note.id)
+    ).all()
+
+def delete_folder_tree(db: Session, owner_id: int, folder_id: int) -> Tuple[List[int], List[int]]:
+    """Delete a folder and all its subfolders without committing
+    
+    Returns the IDs of the deleted folders and of the notes they held,
+    which outlive them at the top level.
+    """
+    db_folder = db.query(Folder).filter(Folder.id == folder_id, Folder.owner_id == owner_id).first()
     if not db_folder:
         raise HTTPException(status_code=404, detail="Folder not found")
     
+    deleted_ids = []
+    
     # Delete all subfolders recursively
     def delete_subfolders(folder):
         for subfolder in folder.subfolders:
             delete_subfolders(subfolder)
+        deleted_ids.append(folder.id)
         db.delete(folder)
     
     delete_subfolders(db_folder)
+    return deleted_ids, detach_notes(db, owner_id, deleted_ids)
+
+@router.put("/{folder_id}", response_model=FolderSchema)
+def update_folder(
+    folder_id: int,
+    folder_update: FolderUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Update a folder with a single conditional UPDATE ... RETURNING statement"""
+    expected_version = resolve_expected_version(if_match, folder_update.expected_version)
+    update_data = folder_update.model_dump(exclude_unset=True, exclude={"expected_version"})
+    db_folder = apply_folder_update(db, owner_id, folder_id, update_data, expected_version)
+    
+    # Serialize before committing so the expired instance is not reloaded
+    result = FolderSchema.model_validate(db_folder)
+    notify_changes(db, owner_id, [change("folder", "update", folder_id, result.version)])
+    db.commit()
+    cache.delete(folder_tree_key(owner_id))
+    response.headers["ETag"] = etag(result.version)
+    return result
+
+@router.post("/{folder_id}/move", response_model=FolderSummary)
+def move_folder(
+    folder_id: int,
+    move: FolderMove,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Move a folder and its subtree under a new parent, or to the top level"""
+    expected_version = resolve_expected_version(if_match, move.expected_version)
+    db_folder = apply_folder_update(db, owner_id, folder_id, {"parent_id": move.parent_id}, expected_version)
+    
+    # The summary leaves out subfolders, which would load the moved subtree one level at a time
+    result = FolderSummary.model_validate(db_folder)
+    notify_changes(db, owner_id, [change("folder", "update", folder_id, result.version)])
+    db.commit()
+    cache.delete(folder_tree_key(owner_id))
+    response.headers["ETag"] = etag(result.version)
+    return result
+
+@job_handler("delete_folder")
+def delete_folder_job(ctx, folder_id: int):
+    """Delete a folder subtree deepest level first, one short transaction per batch"""
+    with ctx.session_factory() as db:
+        subtree = folder_subtree(folder_id, ctx.owner_id)
+        rows = db.execute(select(Folder.id, Folder.parent_id).join(subtree, Folder.id == subtree.c.id)).all()
+        parents = dict(rows)
+        
+        def depth(node):
+            level = 0
+            while node != folder_id and parents.get(node) in parents:
+                node = parents[node]
+                level += 1
+            return level
+        
+        # Children go before their parents, so every batch satisfies the parent_id key
+        ordered = sorted(parents, key=depth, reverse=True)
+        ctx.progress(0, len(ordered))
+        for start in range(0, len(ordered), DELETE_BATCH_SIZE):
+            batch = ordered[start:start + DELETE_BATCH_SIZE]
+            # Notes outlive their folder, as with the ORM delete
+            detached = detach_notes(db, ctx.owner_id, batch)
+            db.execute(delete(Folder).where(Folder.owner_id == ctx.owner_id, Folder.id.in_(batch)))
+            notify_changes(db, ctx.owner_id, [change("folder", "delete", deleted_id) for deleted_id in batch])
+            db.commit()
+            cache.delete(folder_tree_key(ctx.owner_id), *(note_key(ctx.owner_id, note_id) for note_id in detached))
+            ctx.progress(start + len(batch))
+    return {"deleted": len(ordered)}
+
+@router.delete("/{folder_id}")
+def delete_folder(
+    folder_id: int,
+    prefer: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Delete a folder and all its subfolders, as a job with Prefer: respond-async"""
+    if wants_async(prefer):
+        require_folder(db, owner_id, folder_id)
+        return accepted(runner.submit(db, "delete_folder", {"folder_id": folder_id}, owner_id))
+    
+    deleted_ids, detached = delete_folder_tree(db, owner_id, folder_id)
+    notify_changes(db, owner_id, [change("folder", "delete", deleted_id) for deleted_id in deleted_ids])
     db.commit()
-    return {"message": "Folder deleted successfully"}
\ No newline at end of file
+    cache.delete(folder_tree_key(owner_id), *(note_key(owner_id, note_id) for note_id in detached))
+    return {"message": "Folder deleted successfully"}
@@ -0,0 +1,54 @@
+import json
+import mimetypes
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from app.database.connection import get_db
+from app.models.models import Job
+from app.schemas.schemas import Job as JobSchema
+from app.services.jobs import runner, result_file_path
+from app.services.owners import get_owner_id
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def get_job_or_404(db: Session, owner_id: int, job_id: int) -> Job:
+    job = db.query(Job).filter(Job.id == job_id, Job.owner_id == owner_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}", response_model=JobSchema)
+def get_job(job_id: int, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Get the status and progress of a job"""
+    return get_job_or_404(db, owner_id, job_id)
+
+@router.post("/{job_id}/cancel", response_model=JobSchema)
+def cancel_job(job_id: int, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Cancel a job; a running job stops at its next progress update"""
+    return runner.cancel(db, job_id, owner_id)
+
+def succeeded_job_or_409(db: Session, owner_id: int, job_id: int) -> Job:
+    job = get_job_or_404(db, owner_id, job_id)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail={"status": job.status, "error": job.error})
+    return job
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: int, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Get the result of a finished job"""
+    return json.loads(succeeded_job_or_409(db, owner_id, job_id).result)
+
+@router.get("/{job_id}/result/download")
+def download_job_result(job_id: int, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Download the file a finished job left for its owner, such as an export"""
+    result = json.loads(succeeded_job_or_409(db, owner_id, job_id).result)
+    path = result_file_path(job_id)
+    if not isinstance(result, dict) or "filename" not in result or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Job has no result file")
+    return FileResponse(
+        path,
+        media_type=mimetypes.guess_type(result["filename"])[0] or "application/octet-stream",
+        filename=result["filename"],
+        headers={"Cache-Control": "private, no-store", "X-Content-Type-Options": "nosniff"},
+    )
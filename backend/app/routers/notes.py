@@ -1,89 +1,518 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update, func, case, bindparam
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.database.connection import get_db
-from app.models.models import Note
-from app.schemas.schemas import NoteCreate, NoteUpdate, Note as NoteSchema
+from typing import List, Literal, Optional
+from app.database.connection import get_db, get_read_db, reads_primary, wrote_recently
+from app.database.search import search_notes, rebuild_search_index
+from app.database.tags import tag_filter, tag_counts
+from app.routers.folders import folder_subtree, require_folder, require_folders
+from app.models.models import Note, NoteRevision
+from app.schemas.schemas import (
+    NoteCreate, NoteUpdate, Note as NoteSchema,
+    NoteRevision as NoteRevisionSchema, NoteRevisionContent, TagCount, normalize_tags,
+)
+from app.services.concurrency import resolve_expected_version, etag, version_conflict
+from app.services.cache import cache, note_key, tag_cloud_key
+from app.services.events import notify_changes, change
+from app.services.blobs import extract_inline_blobs
+from app.services.revisions import record_revision, materialize_revision
+from app.services.chunks import should_chunk, build_chunks, write_chunks, chunk_layout, read_chunk_range
+from app.services.jobs import job_handler, runner, wants_async, accepted
+from app.services.owners import get_owner_id, require_admin
+from app.services.streaming import json_array_response
+from app.routers.blobs import parse_range
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
+# Synced notes per transaction, and between progress updates of a sync job
+SYNC_BATCH_SIZE = 50
+# Note writes drop the cached tag cloud; the TTL covers writes from other paths
+TAG_CLOUD_TTL_SECONDS = int(os.getenv("TAG_CLOUD_TTL_SECONDS", "300"))
+# Reads of a chunked note's content started over because a write replaced its chunks
+CONTENT_READ_ATTEMPTS = 3
+
 @router.get("/", response_model=List[NoteSchema])
-def get_notes(folder_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """Get all notes, optionally filtered by folder"""
-    query = db.query(Note).filter(Note.is_deleted == False)
-    if folder_id is not None:
+def get_notes(
+    folder_id: Optional[int] = None,
+    recursive: bool = False,
+    tag: List[str] = Query([]),
+    tag_match: Literal["all", "any"] = "all",
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    stream: bool = False,
+    db: Session = Depends(get_read_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Get notes, newest first, optionally filtered by folder or folder subtree and by tags
+    
+    Repeat tag to filter by several tags; tag_match says whether a note
+    needs all of them or any of them. With stream, notes are sent as they
+    are read, STREAM_BATCH_SIZE at a time.
+    """
+    query = db.query(Note).filter(Note.owner_id == owner_id, Note.is_deleted == False)
+    try:
+        tags = normalize_tags(tag)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if tags:
+        query = query.filter(tag_filter(db, tags, match_all=tag_match == "all"))
+    if folder_id is not None and recursive:
+        # One round trip regardless of how deep the subtree is
+        subtree = folder_subtree(folder_id, owner_id)
+        query = query.join(subtree, Note.folder_id == subtree.c.id)
+    elif folder_id is not None:
         query = query.filter(Note.folder_id == folder_id)
-    return query.all()
+    query = query.order_by(Note.updated_at.desc(), Note.id.desc()).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    if stream:
+        return json_array_response(db, query.statement, NoteSchema)
+    return query.execution_options(prepare=True).all()
+
+@router.get("/trash", response_model=List[NoteSchema])
+def get_trash(db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)):
+    """Get soft-deleted notes that have not been purged yet, newest first"""
+    return (
+        db.query(Note)
+        .filter(Note.owner_id == owner_id, Note.is_deleted == True)
+        .order_by(Note.deleted_at.desc())
+        .all()
+    )
+
+@router.get("/recent", response_model=List[NoteSchema])
+def get_recent_notes(
+    limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)
+):
+    """Get the most recently edited notes"""
+    return (
+        db.query(Note)
+        .filter(Note.owner_id == owner_id, Note.is_deleted == False)
+        .order_by(Note.updated_at.desc(), Note.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+@router.get("/tags", response_model=List[TagCount])
+def get_tag_cloud(request: Request, db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)):
+    """Get the owner's tags with the number of notes carrying each, most used first"""
+    # Right after a write the cached entry may predate it, as may one filled from the replica
+    cached = None if wrote_recently(request) else cache.get(tag_cloud_key(owner_id))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    counts = tag_counts(db, owner_id)
+    if reads_primary(db):
+        cache.set(tag_cloud_key(owner_id), json.dumps(counts), ttl=TAG_CLOUD_TTL_SECONDS)
+    return counts
+
+@router.get("/search", response_model=List[NoteSchema])
+def search(
+    q: str, limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)
+):
+    """Full-text search over note titles and content"""
+    return search_notes(db, owner_id, q, limit)
+
+@job_handler("reindex_search")
+def reindex_search_job(ctx):
+    with ctx.session_factory() as db:
+        rebuild_search_index(db.get_bind())
+    return {}
+
+@router.post("/search/reindex", status_code=202, dependencies=[Depends(require_admin)])
+def reindex_search(db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Rebuild the full-text search index, shared by all owners, in the background"""
+    return accepted(runner.submit(db, "reindex_search", {}, owner_id))
 
 @router.get("/{note_id}", response_model=NoteSchema)
-def get_note(note_id: int, db: Session = Depends(get_db)):
+def get_note(
+    note_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    owner_id: int = Depends(get_owner_id)
+):
     """Get a specific note by ID"""
-    note = db.query(Note).filter(Note.id == note_id, Note.is_deleted == False).first()
+    # Cached entries are stored as "<version>:<json>" so hits skip serialization.
+    # Writers skip the cache for the read-your-writes window, as reads_primary explains.
+    cached = None if wrote_recently(request) else cache.get(note_key(owner_id, note_id))
+    if cached is not None:
+        version, body = cached.split(":", 1)
+        return Response(content=body, media_type="application/json", headers={"ETag": etag(int(version))})
+    
+    note = db.query(Note).filter(
+        Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False
+    ).execution_options(prepare=True).first()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    return note
+    result = NoteSchema.model_validate(note)
+    # Chunked notes are large enough to crowd everything else out of the cache
+    if not note.is_chunked and reads_primary(db):
+        cache.set(note_key(owner_id, note_id), f"{result.version}:{result.model_dump_json()}")
+    response.headers["ETag"] = etag(result.version)
+    return result
+
+@router.get("/{note_id}/content")
+def get_note_content(
+    note_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    db: Session = Depends(get_read_db),
+    owner_id: int = Depends(get_owner_id),
+):
+    """Stream the content of a note as HTML, with byte-range support"""
+    # A write between reading the chunk layout and the chunks makes the read start over
+    for _ in range(CONTENT_READ_ATTEMPTS):
+        note = db.query(Note.version, Note.is_chunked, Note.content).filter(
+            Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False
+        ).first()
+        if not note:
+            raise HTTPException(status_code=404, detail="Note not found")
+        
+        if note.is_chunked:
+            layout = chunk_layout(db, note_id, note.version)
+            if not layout:
+                continue
+            size = sum(chunk_size for _, chunk_size in layout)
+            read = lambda start, end: read_chunk_range(db, note_id, note.version, layout, start, end)
+        else:
+            encoded = note.content.encode()
+            size = len(encoded)
+            read = lambda start, end: iter([encoded[start:end + 1]])
+        
+        headers = {"ETag": etag(note.version), "Accept-Ranges": "bytes"}
+        status_code = 200
+        start, end = 0, size - 1
+        if range_header is not None:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                raise HTTPException(
+                    status_code=416,
+                    detail="Requested range not satisfiable",
+                    headers={"Content-Range": f"bytes */{size}"},
+                )
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        body = read(start, end)
+        if body is not None:
+            return StreamingResponse(
+                body, status_code=status_code, media_type="text/html; charset=utf-8", headers=headers
+            )
+    raise HTTPException(status_code=503, detail="Note is being rewritten", headers={"Retry-After": "1"})
 
 @router.post("/", response_model=NoteSchema)
-def create_note(note: NoteCreate, db: Session = Depends(get_db)):
+def create_note(note: NoteCreate, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
     """Create a new note"""
-    db_note = Note(**note.model_dump())
+    db_note = Note(**note_values(db, note, owner_id))
     db.add(db_note)
+    db.flush()
+    notify_changes(db, owner_id, [change("note", "create", db_note.id, db_note.version)])
     db.commit()
+    if db_note.tags:
+        cache.delete(tag_cloud_key(owner_id))
     db.refresh(db_note)
     return db_note
 
-@router.put("/{note_id}", response_model=NoteSchema)
-def update_note(note_id: int, note_update: NoteUpdate, db: Session = Depends(get_db)):
-    """Update a note"""
-    db_note = db.query(Note).filter(Note.id == note_id, Note.is_deleted == False).first()
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found")
+def note_values(db: Session, note: NoteCreate, owner_id: int) -> dict:
+    """Column values for a new note, with embedded images moved to the blob store"""
+    require_folder(db, owner_id, note.folder_id)
+    return stored_note_values(note, owner_id)
+
+def stored_note_values(note: NoteCreate, owner_id: int) -> dict:
+    values = {**note.model_dump(), "owner_id": owner_id}
+    values["content"] = extract_inline_blobs(values["content"])
+    if should_chunk(values["content"]):
+        values["chunks"] = build_chunks(values.pop("content"))
+        values["is_chunked"] = True
+    return values
+
+def apply_note_update(
+    db: Session, owner_id: int, note_id: int, update_data: dict, expected_version: Optional[int] = None
+) -> Note:
+    """Run a conditional UPDATE ... RETURNING for a note, raising 404 or 409
     
-    update_data = note_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_note, field, value)
+    The previous title and content are kept as a revision of the note. On
+    PostgreSQL they come back from the same statement via a self-join.
+    Content of chunked notes is written separately, chunk by chunk.
+    """
+    if update_data.get("folder_id") is not None:
+        require_folder(db, owner_id, update_data["folder_id"])
+    new_content = update_data.get("content")
+    if new_content is not None:
+        new_content = extract_inline_blobs(new_content)
+        if should_chunk(new_content):
+            stored_content = {"content": "", "is_chunked": True}
+        else:
+            # Once chunked a note stays chunked, so only its chunks change
+            stored_content = {"content": case((Note.is_chunked == True, ""), else_=new_content)}
+        update_data = {**update_data, **stored_content}
     
-    db.commit()
-    db.refresh(db_note)
+    stmt = (
+        update(Note)
+        .where(Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False)
+        .values(**update_data, version=Note.version + 1)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Note.version == expected_version)
+    
+    previous = None
+    if db.get_bind().dialect.name == "postgresql":
+        # Joined rows in UPDATE ... FROM still show the values before the update
+        old = Note.__table__.alias("old_notes")
+        returning = [Note, old.c.title.label("old_title")]
+        if "content" in update_data:
+            returning.append(old.c.content.label("old_content"))
+        # The owner predicate on both sides lets each one be pruned to a single partition
+        stmt = stmt.where(old.c.id == Note.id, old.c.owner_id == owner_id).returning(*returning)
+    else:
+        # SQLite's RETURNING only sees new values, so read the old ones first
+        previous = db.query(Note.title, Note.content).filter(Note.id == note_id, Note.owner_id == owner_id).first()
+        stmt = stmt.returning(Note)
+    
+    row = db.execute(
+        stmt, execution_options={"synchronize_session": False, "populate_existing": True, "prepare": True}
+    ).first()
+    if row is None:
+        db.rollback()
+        current_version = db.query(Note.version).filter(
+            Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False
+        ).scalar()
+        if current_version is None:
+            raise HTTPException(status_code=404, detail="Note not found")
+        raise version_conflict("Note", current_version)
+    
+    db_note = row[0]
+    if previous is not None:
+        old_title, old_content = previous
+    else:
+        old_title = row[1]
+        old_content = row[2] if len(row) > 2 else db_note.content
+    
+    if not db_note.is_chunked:
+        content = db_note.content
+    elif new_content is not None:
+        content = new_content
+        chunked_content = write_chunks(db_note, new_content)
+        if chunked_content is not None:
+            old_content = chunked_content
+    else:
+        content = old_content = db_note.full_content
+    record_revision(db, db_note, db_note.version - 1, old_title, old_content, content)
     return db_note
 
-@router.delete("/{note_id}")
-def delete_note(note_id: int, db: Session = Depends(get_db)):
-    """Soft delete a note"""
-    db_note = db.query(Note).filter(Note.id == note_id, Note.is_deleted == False).first()
+def soft_delete_note(db: Session, owner_id: int, note_id: int) -> Note:
+    """Mark a note as deleted without committing"""
+    db_note = db.query(Note).filter(Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False).first()
     if not db_note:
         raise HTTPException(status_code=404, detail="Note not found")
-    
+    # The flush bumps the version, so keep the replaced one like any other write
+    content = db_note.full_content
+    record_revision(db, db_note, db_note.version, db_note.title, content, content)
     db_note.is_deleted = True
+    db_note.deleted_at = func.now()
+    return db_note
+
+@router.put("/{note_id}", response_model=NoteSchema)
+def update_note(
+    note_id: int,
+    note_update: NoteUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Update a note with a single conditional UPDATE ... RETURNING statement"""
+    expected_version = resolve_expected_version(if_match, note_update.expected_version)
+    update_data = note_update.model_dump(exclude_unset=True, exclude={"expected_version"})
+    db_note = apply_note_update(db, owner_id, note_id, update_data, expected_version)
+    
+    # Serialize before committing so the expired instance is not reloaded
+    result = NoteSchema.model_validate(db_note)
+    notify_changes(db, owner_id, [change("note", "update", note_id, result.version)])
+    db.commit()
+    cache.delete(note_key(owner_id, note_id), tag_cloud_key(owner_id))
+    response.headers["ETag"] = etag(result.version)
+    return result
+
+@router.delete("/{note_id}")
+def delete_note(note_id: int, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)):
+    """Soft delete a note"""
+    soft_delete_note(db, owner_id, note_id)
+    notify_changes(db, owner_id, [change("note", "delete", note_id)])
     db.commit()
+    cache.delete(note_key(owner_id, note_id), tag_cloud_key(owner_id))
     return {"message": "Note deleted successfully"}
 
-@router.post("/sync", response_model=List[NoteSchema])
-def sync_notes(notes: List[NoteCreate], db: Session = Depends(get_db)):
-    """Sync multiple notes (for offline sync)"""
-    synced_notes = []
+@router.post("/{note_id}/restore", response_model=NoteSchema)
+def restore_note(
+    note_id: int, response: Response, db: Session = Depends(get_db), owner_id: int = Depends(get_owner_id)
+):
+    """Restore a soft-deleted note from the trash"""
+    stmt = (
+        update(Note)
+        .where(Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == True)
+        .values(is_deleted=False, deleted_at=None, version=Note.version + 1)
+        .returning(Note)
+    )
+    db_note = db.scalars(stmt, execution_options={"synchronize_session": False}).first()
+    if db_note is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Note not found in trash")
+    content = db_note.full_content
+    record_revision(db, db_note, db_note.version - 1, db_note.title, content, content)
+    
+    result = NoteSchema.model_validate(db_note)
+    notify_changes(db, owner_id, [change("note", "restore", note_id, result.version)])
+    db.commit()
+    cache.delete(tag_cloud_key(owner_id))
+    response.headers["ETag"] = etag(result.version)
+    return result
+
+@router.get("/{note_id}/revisions", response_model=List[NoteRevisionSchema])
+def get_revisions(note_id: int, db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)):
+    """List the stored revisions of a note, newest first"""
+    if not db.query(Note.id).filter(Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False).first():
+        raise HTTPException(status_code=404, detail="Note not found")
+    return (
+        db.query(NoteRevision)
+        .filter(NoteRevision.note_id == note_id)
+        .order_by(NoteRevision.version.desc())
+        .all()
+    )
+
+@router.get("/{note_id}/revisions/{version}", response_model=NoteRevisionContent)
+def get_revision(
+    note_id: int, version: int, db: Session = Depends(get_read_db), owner_id: int = Depends(get_owner_id)
+):
+    """Materialize the content of a note as it was at a given version"""
+    note = db.query(Note).filter(Note.id == note_id, Note.owner_id == owner_id, Note.is_deleted == False).first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    
+    materialized = materialize_revision(db, note, version)
+    if materialized is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    revision, content = materialized
+    return NoteRevisionContent(
+        note_id=note_id,
+        version=revision.version,
+        title=revision.title,
+        is_snapshot=revision.is_snapshot,
+        created_at=revision.created_at,
+        content=content,
+    )
+
+def sync_note_batch(db: Session, owner_id: int, notes: List[NoteCreate]) -> List[Note]:
+    """Create or update a batch of synced notes in one transaction
     
+    Notes match existing ones by title and folder. Lookups and inserts
+    cover the whole batch, and plain updates go out as one executemany,
+    which psycopg 3 sends in pipeline mode, so a batch costs a handful of
+    round trips rather than several per note. Chunked notes take the
+    regular per-note update path.
+    """
+    require_folders(db, owner_id, [note.folder_id for note in notes])
+    matches = {}
+    if notes:
+        # Locked until commit, so the versions read here are the ones replaced
+        candidates = db.query(Note).filter(
+            Note.owner_id == owner_id,
+            Note.is_deleted == False,
+            Note.title.in_({note.title for note in notes}),
+        ).order_by(Note.id).with_for_update()
+        for candidate in candidates:
+            matches.setdefault((candidate.title, candidate.folder_id), candidate)
+    
+    synced, created, updates = [], [], {}
     for note_data in notes:
-        # Check if note already exists (by title and folder for simplicity)
-        existing_note = db.query(Note).filter(
-            Note.title == note_data.title,
-            Note.folder_id == note_data.folder_id,
-            Note.is_deleted == False
-        ).first()
-        
-        if existing_note:
-            # Update existing note
-            for field, value in note_data.model_dump().items():
-                setattr(existing_note, field, value)
-            db.commit()
-            db.refresh(existing_note)
-            synced_notes.append(existing_note)
-        else:
-            # Create new note
-            db_note = Note(**note_data.model_dump())
+        key = (note_data.title, note_data.folder_id)
+        values = stored_note_values(note_data, owner_id)
+        db_note = matches.get(key)
+        if db_note is None:
+            db_note = matches[key] = Note(**values)
             db.add(db_note)
-            db.commit()
-            db.refresh(db_note)
-            synced_notes.append(db_note)
+            created.append(db_note)
+        elif db_note in created:
+            for name, value in values.items():
+                setattr(db_note, name, value)
+        elif db_note.is_chunked or values.get("is_chunked"):
+            updates.pop(db_note.id, None)
+            apply_note_update(db, owner_id, db_note.id, note_data.model_dump())
+        else:
+            # A note synced twice in one batch is written once, with the last values
+            updates[db_note.id] = {
+                "b_id": db_note.id,
+                "b_version": db_note.version,
+                "b_title": values["title"],
+                "b_content": values["content"],
+                "b_folder_id": values["folder_id"],
+                "b_tags": values["tags"],
+            }
+        synced.append(db_note)
     
-    return synced_notes
\ No newline at end of file
+    if updates:
+        for db_note in {note.id: note for note in synced}.values():
+            if db_note.id in updates:
+                record_revision(
+                    db, db_note, db_note.version, db_note.title, db_note.content, updates[db_note.id]["b_content"]
+                )
+        notes_table = Note.__table__
+        db.execute(
+            update(notes_table)
+            .where(
+                notes_table.c.id == bindparam("b_id"),
+                notes_table.c.owner_id == owner_id,
+                notes_table.c.version == bindparam("b_version"),
+            )
+            .values(
+                title=bindparam("b_title"),
+                content=bindparam("b_content"),
+                folder_id=bindparam("b_folder_id"),
+                tags=bindparam("b_tags"),
+                version=bindparam("b_version") + 1,
+            ),
+            list(updates.values()),
+        )
+    db.flush()
+    
+    unique = list({note.id: note for note in synced}.values())
+    note_ids = [note.id for note in unique]
+    versions = {note_id: params["b_version"] + 1 for note_id, params in updates.items()}
+    notify_changes(db, owner_id, [
+        change("note", "create" if note in created else "update", note.id, versions.get(note.id, note.version))
+        for note in unique
+    ])
+    db.commit()
+    cache.delete(tag_cloud_key(owner_id), *(note_key(owner_id, note_id) for note_id in note_ids))
+    # Reload every synced note in one query instead of one refresh each
+    if note_ids:
+        db.query(Note).filter(Note.id.in_(note_ids), Note.owner_id == owner_id).populate_existing().all()
+    return synced
+
+@job_handler("sync_notes")
+def sync_notes_job(ctx, notes: List[dict]):
+    with ctx.session_factory() as db:
+        note_ids = []
+        for start in range(0, len(notes), SYNC_BATCH_SIZE):
+            batch = [NoteCreate(**note_data) for note_data in notes[start:start + SYNC_BATCH_SIZE]]
+            note_ids.extend(note.id for note in sync_note_batch(db, ctx.owner_id, batch))
+            ctx.progress(start + len(batch), len(notes))
+    return {"note_ids": note_ids}
+
+@router.post("/sync", response_model=List[NoteSchema])
+def sync_notes(
+    notes: List[NoteCreate],
+    prefer: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    owner_id: int = Depends(get_owner_id)
+):
+    """Sync multiple notes (for offline sync), as a job with Prefer: respond-async"""
+    if wants_async(prefer):
+        params = {"notes": [note.model_dump(mode="json") for note in notes]}
+        return accepted(runner.submit(db, "sync_notes", params, owner_id))
+    synced = []
+    for start in range(0, len(notes), SYNC_BATCH_SIZE):
+        synced.extend(sync_note_batch(db, owner_id, notes[start:start + SYNC_BATCH_SIZE]))
+    return synced
@@ -1,7 +1,22 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import AfterValidator, AliasChoices, BaseModel, BeforeValidator, Field
+from typing import Annotated, Optional, List, Dict, Any, Union, Literal
 from datetime import datetime
 
+MAX_TAGS = 32
+MAX_TAG_LENGTH = 50
+
+def normalize_tags(tags: List[str]) -> List[str]:
+    """Trim and lowercase tags, dropping empty and repeated ones"""
+    normalized = list(dict.fromkeys(tag.strip().lower() for tag in tags if tag.strip()))
+    if len(normalized) > MAX_TAGS:
+        raise ValueError(f"A note can have at most {MAX_TAGS} tags")
+    if any(len(tag) > MAX_TAG_LENGTH for tag in normalized):
+        raise ValueError(f"Tags can be at most {MAX_TAG_LENGTH} characters long")
+    return normalized
+
+# null clears the tags like an empty list
+Tags = Annotated[List[str], BeforeValidator(lambda value: [] if value is None else value), AfterValidator(normalize_tags)]
+
 class FolderBase(BaseModel):
     name: str
     icon: str = "📁"
@@ -14,20 +29,29 @@ class FolderUpdate(BaseModel):
     name: Optional[str] = None
     icon: Optional[str] = None
     parent_id: Optional[int] = None
+    expected_version: Optional[int] = None
+
+class FolderMove(BaseModel):
+    parent_id: Optional[int] = None
+    expected_version: Optional[int] = None
 
-class Folder(FolderBase):
+class FolderSummary(FolderBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
-    subfolders: List["Folder"] = []
+    version: int = 1
     
     class Config:
         from_attributes = True
 
+class Folder(FolderSummary):
+    subfolders: List["Folder"] = []
+
 class NoteBase(BaseModel):
     title: str = "Unbenannt"
     content: str = ""
     folder_id: Optional[int] = None
+    tags: Tags = []
 
 class NoteCreate(NoteBase):
     pass
@@ -36,15 +60,96 @@ class NoteUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
     folder_id: Optional[int] = None
+    # Defaults are not validated, so an omitted field stays None and is left unchanged
+    tags: Tags = None
+    expected_version: Optional[int] = None
 
 class Note(NoteBase):
+    # Read through full_content so chunked notes are reassembled
+    content: str = Field("", validation_alias=AliasChoices("full_content", "content"))
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
     is_deleted: bool = False
+    deleted_at: Optional[datetime] = None
+    version: int = 1
     
     class Config:
         from_attributes = True
 
+class NoteRevision(BaseModel):
+    note_id: int
+    version: int
+    title: str
+    is_snapshot: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class NoteRevisionContent(NoteRevision):
+    content: str
+
+class BatchOperation(BaseModel):
+    type: Literal["folder", "note"]
+    action: Literal["create", "update", "delete"]
+    id: Optional[Union[int, str]] = None
+    temp_id: Optional[Union[int, str]] = None
+    data: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class BatchResult(BaseModel):
+    type: str
+    action: str
+    id: int
+    temp_id: Optional[Union[int, str]] = None
+    folder: Optional[Folder] = None
+    note: Optional[Note] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+    id_map: Dict[str, Dict[str, int]]
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+class AutocompleteMatch(BaseModel):
+    type: Literal["note", "folder"]
+    id: int
+    title: str
+    score: float
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress_done: int = 0
+    progress_total: Optional[int] = None
+    cancel_requested: bool = False
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class SlowQuery(BaseModel):
+    statement: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    last_ms: float
+    # Number of slow executions per route that ran the statement
+    routes: Dict[str, int]
+    last_parameters: Any = None
+    last_seen: datetime
+    plan: Optional[str] = None
+    plan_captured_at: Optional[datetime] = None
+
 # Update forward reference
 Folder.model_rebuild()
\ No newline at end of file
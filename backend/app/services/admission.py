@@ -0,0 +1,174 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from fastapi import HTTPException, Request
+from app.database.connection import engine
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+# Token buckets are kept for this many recently seen clients per route class
+MAX_TRACKED_CLIENTS = int(os.getenv("ADMISSION_MAX_TRACKED_CLIENTS", "10000"))
+
+def pool_capacity(db_engine) -> int:
+    """Number of connections the engine's pool can hand out at once"""
+    pool = db_engine.pool
+    if not hasattr(pool, "size"):
+        return 1
+    return pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+
+DB_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", str(pool_capacity(engine))))
+
+class ConcurrencyLimiter:
+    """FIFO semaphore whose waiters give up after a deadline"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+    
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+    
+    async def acquire(self, timeout: float) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the deadline passed
+                return True
+            waiter.cancel()
+            return False
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+    
+    def release(self):
+        # Hand the slot straight to the oldest waiter instead of freeing it
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def take(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class RouteLimit:
+    """Admission limits shared by a class of routes
+    
+    `concurrency` caps requests of this class in flight, `queue_timeout` is
+    how long a request may wait for a slot before it is shed with a 503,
+    and `rate`/`burst` define each client's token bucket (rate 0 disables it).
+    """
+    
+    def __init__(self, name: str, concurrency: int, queue_timeout: float, rate: float, burst: float):
+        self.name = name
+        self.limiter = ConcurrencyLimiter(concurrency)
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()
+    
+    @classmethod
+    def from_env(cls, name: str, concurrency: int, queue_timeout: float, rate: float, burst: float):
+        prefix = f"ADMISSION_{name.upper()}_"
+        return cls(
+            name,
+            int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+            float(os.getenv(prefix + "QUEUE_TIMEOUT", str(queue_timeout))),
+            float(os.getenv(prefix + "RATE", str(rate))),
+            float(os.getenv(prefix + "BURST", str(burst))),
+        )
+    
+    def check_rate(self, client: str) -> float:
+        if self.rate <= 0:
+            return 0
+        bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+        self._buckets[client] = bucket
+        if len(self._buckets) > MAX_TRACKED_CLIENTS:
+            self._buckets.popitem(last=False)
+        return bucket.take()
+
+# Every database-backed request holds a slot of the pool-sized limiter, so
+# requests wait here with a deadline instead of piling up in the thread pool
+pool_limit = ConcurrencyLimiter(DB_CONCURRENCY)
+
+ROUTE_LIMITS = {
+    "interactive": RouteLimit.from_env("interactive", DB_CONCURRENCY, 2.0, 100, 500),
+    # Bulk writes get a fraction of the pool so they cannot starve interactive calls
+    "bulk": RouteLimit.from_env("bulk", max(DB_CONCURRENCY // 4, 1), 0.5, 1, 10),
+}
+
+# Routes by endpoint name; unlisted routes are interactive and None skips admission
+ROUTE_CLASSES = {
+    "sync_notes": "bulk",
+    "run_batch": "bulk",
+    "export_notes": "bulk",
+    "reindex_search": "bulk",
+    # Streams stay open indefinitely and do not hold a connection
+    "stream_events": None,
+    "get_blob": None,
+    # Load balancer probes report saturation rather than queue behind it
+    "health_check": None,
+    "readiness_check": None,
+}
+
+def _client_id(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+def _retry_after(seconds: float) -> dict:
+    return {"Retry-After": str(max(math.ceil(seconds), 1))}
+
+async def admission_control(request: Request):
+    """Rate-limit and queue requests in front of the database pool"""
+    endpoint = request.scope.get("endpoint")
+    route_class = ROUTE_CLASSES.get(getattr(endpoint, "__name__", None), "interactive")
+    if not ADMISSION_ENABLED or route_class is None:
+        yield
+        return
+    route_limit = ROUTE_LIMITS[route_class]
+    
+    wait = route_limit.check_rate(_client_id(request))
+    if wait:
+        raise HTTPException(status_code=429, detail="Too many requests", headers=_retry_after(wait))
+    
+    deadline = time.monotonic() + route_limit.queue_timeout
+    if not await route_limit.limiter.acquire(route_limit.queue_timeout):
+        raise HTTPException(status_code=503, detail="Server busy", headers=_retry_after(route_limit.queue_timeout))
+    try:
+        if not await pool_limit.acquire(max(deadline - time.monotonic(), 0)):
+            raise HTTPException(status_code=503, detail="Server busy", headers=_retry_after(route_limit.queue_timeout))
+        try:
+            yield
+        finally:
+            pool_limit.release()
+    finally:
+        route_limit.limiter.release()
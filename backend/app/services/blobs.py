@@ -0,0 +1,81 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "blobs"),
+)
+# Notes refer to blobs by path, so they stay valid when the API moves to
+# another host; clients resolve the path against the API origin
+BLOB_PATH = "/api/blobs"
+
+# Only raster images are moved to the blob store. Blobs are served from the
+# API origin, where an SVG could run script, so other types stay inline.
+IMAGE_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp")
+
+DATA_URI_PATTERN = re.compile(
+    r"data:(" + "|".join(re.escape(t) for t in IMAGE_TYPES) + r");base64,([A-Za-z0-9+/=\s]+)", re.IGNORECASE
+)
+BLOB_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# References to stored blobs that a client sends back resolved against its API origin
+ABSOLUTE_BLOB_URL_PATTERN = re.compile(r"https?://[^\s\"'<>/]+" + re.escape(BLOB_PATH) + r"/([0-9a-f]{64})\b")
+
+def blob_path(blob_id: str) -> str:
+    # Fan out into 256 subdirectories to keep directory listings small
+    return os.path.join(BLOB_STORE_DIR, blob_id[:2], blob_id)
+
+def store_blob(data: bytes, content_type: str) -> str:
+    """Store bytes under their SHA-256 and return the hash; identical blobs are stored once"""
+    blob_id = hashlib.sha256(data).hexdigest()
+    path = blob_path(blob_id)
+    if os.path.exists(path):
+        return blob_id
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp file and rename so readers never see a partial blob
+    for target, payload in ((path + ".type", content_type.encode()), (path, data)):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(payload)
+        os.replace(tmp_path, target)
+    return blob_id
+
+def blob_url(blob_id: str) -> str:
+    return f"{BLOB_PATH}/{blob_id}"
+
+def blob_content_type(blob_id: str) -> Optional[str]:
+    """Return the content type of a stored blob, or None if it does not exist"""
+    if not BLOB_ID_PATTERN.match(blob_id) or not os.path.exists(blob_path(blob_id)):
+        return None
+    try:
+        with open(blob_path(blob_id) + ".type") as f:
+            return f.read()
+    except FileNotFoundError:
+        return "application/octet-stream"
+
+def extract_inline_blobs(content: str) -> str:
+    """Move base64 data URIs out of note HTML into the blob store
+    
+    Each embedded image is replaced by the path of its content-addressed
+    blob, so the note row only carries a short reference. Absolute URLs of
+    stored blobs are shortened to the same path.
+    """
+    if not content or ("data:" not in content and BLOB_PATH not in content):
+        return content
+    
+    def replace(match):
+        try:
+            data = base64.b64decode(re.sub(r"\s+", "", match.group(2)), validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        return blob_url(store_blob(data, match.group(1).lower()))
+    
+    def shorten(match):
+        return blob_url(match.group(1)) if blob_content_type(match.group(1)) is not None else match.group(0)
+    
+    return ABSOLUTE_BLOB_URL_PATTERN.sub(shorten, DATA_URI_PATTERN.sub(replace, content))
@@ -0,0 +1,206 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_KEY_PREFIX = "mynotes:"
+
+def folder_tree_key(owner_id: int) -> str:
+    return f"folders:tree:{owner_id}"
+
+def note_key(owner_id: int, note_id: int) -> str:
+    return f"note:{owner_id}:{note_id}"
+
+def tag_cloud_key(owner_id: int) -> str:
+    return f"tags:{owner_id}"
+
+class Cache(ABC):
+    """Minimal string cache interface shared by all backends"""
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+    
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        ...
+    
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+    
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+class MemoryCache(Cache):
+    """Per-process LRU cache with a per-entry TTL"""
+    
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: int = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisError(Exception):
+    pass
+
+class RedisCache(Cache):
+    """Cache shared by all workers, spoken over the Redis protocol (RESP2)
+    
+    Any server that understands GET, SET EX, DEL and SCAN works, so a
+    local stand-in can serve it in development.
+    """
+    
+    def __init__(self, url: str, ttl: int = CACHE_TTL_SECONDS, timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+    
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._send(conn, "AUTH", self.password)
+        if self.db:
+            self._send(conn, "SELECT", self.db)
+        return conn
+    
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+    
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+    
+    def _send(self, conn, *args):
+        sock, reader = conn
+        sock.sendall(self._encode(*args))
+        return self._read_reply(reader)
+    
+    def _command(self, *args):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            reply = self._send(conn, *args)
+        except RedisError:
+            self._pool.put(conn)
+            raise
+        except (OSError, ConnectionError):
+            conn[0].close()
+            raise
+        self._pool.put(conn)
+        return reply
+    
+    def get(self, key):
+        try:
+            return self._command("GET", CACHE_KEY_PREFIX + key)
+        except (OSError, ConnectionError, RedisError) as e:
+            logger.warning("Cache get failed: %s", e)
+            return None
+    
+    def set(self, key, value, ttl=None):
+        try:
+            self._command("SET", CACHE_KEY_PREFIX + key, value, "EX", ttl or self.ttl)
+        except (OSError, ConnectionError, RedisError) as e:
+            logger.warning("Cache set failed: %s", e)
+    
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self._command("DEL", *[CACHE_KEY_PREFIX + key for key in keys])
+        except (OSError, ConnectionError, RedisError) as e:
+            logger.warning("Cache delete failed: %s", e)
+    
+    def clear(self):
+        cursor = "0"
+        while True:
+            cursor, keys = self._command("SCAN", cursor, "MATCH", CACHE_KEY_PREFIX + "*", "COUNT", 500)
+            if keys:
+                self._command("DEL", *keys)
+            if cursor == "0":
+                break
+
+def create_cache(url: str = CACHE_URL) -> Cache:
+    """Build the cache backend selected by CACHE_URL"""
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryCache()
+    if scheme == "redis":
+        return RedisCache(url)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {scheme}")
+
+cache = create_cache()
@@ -0,0 +1,133 @@
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+from app.services.owners import OWNER_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Requests are appended to this file as JSON lines when set; see
+# benchmarks/replay_traffic.py for replaying them
+TRAFFIC_CAPTURE_FILE = os.getenv("TRAFFIC_CAPTURE_FILE", "")
+
+class TrafficRecorder:
+    """Append anonymized request records to a file from a background thread
+    
+    Only the shape of a request is kept: the route template instead of
+    the URL, query parameter names without values, body sizes, status and
+    timing. Clients are identified by a hash salted per process, so
+    records can be grouped by client but not traced back to one.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._salt = secrets.token_bytes(16)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def anonymize(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode(), "sha256").hexdigest()[:12]
+    
+    def record(self, entry: dict):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write, name="traffic-capture", daemon=True)
+                    self._thread.start()
+        self._queue.put(entry)
+    
+    def _write(self):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                while True:
+                    entry = self._queue.get()
+                    if entry is None:
+                        return
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+        except OSError:
+            logger.exception("Traffic capture to %s stopped", self.path)
+    
+    def stop(self):
+        """Write out queued records and close the file"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+
+recorder: Optional[TrafficRecorder] = TrafficRecorder(TRAFFIC_CAPTURE_FILE) if TRAFFIC_CAPTURE_FILE else None
+
+def stop_capture():
+    if recorder is not None:
+        recorder.stop()
+
+def _flags(headers: dict) -> list:
+    flags = []
+    if "respond-async" in headers.get(b"prefer", b"").decode("latin-1").lower():
+        flags.append("async")
+    if b"range" in headers:
+        flags.append("range")
+    if b"if-match" in headers:
+        flags.append("if-match")
+    return flags
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware recording the shape of every HTTP request while capture is enabled"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        capture = recorder
+        if scope["type"] != "http" or capture is None:
+            await self.app(scope, receive, send)
+            return
+        
+        started_at = time.time()
+        started = time.perf_counter()
+        sizes = {"request": 0, "response": 0}
+        status = 500
+        
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+        
+        async def counting_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            headers = dict(scope.get("headers") or [])
+            client = scope.get("client")
+            owner = headers.get(OWNER_HEADER.lower().encode(), b"").decode("latin-1")
+            route = scope.get("route")
+            capture.record({
+                "ts": round(started_at, 6),
+                "client": capture.anonymize(f"{client[0] if client else ''}|{owner}"),
+                "method": scope["method"],
+                # Unmatched paths may contain anything, so only matched templates are kept
+                "route": getattr(route, "path", None),
+                "query": sorted({name for name, _ in parse_qsl(scope.get("query_string", b"").decode("latin-1"))}),
+                "flags": _flags(headers),
+                "status": status,
+                "request_bytes": sizes["request"],
+                "response_bytes": sizes["response"],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
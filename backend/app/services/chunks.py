@@ -0,0 +1,120 @@
+import itertools
+import math
+import os
+from typing import Iterator, List, Optional
+from sqlalchemy import select
+from app.models.models import Note, NoteChunk
+
+# Notes longer than this many characters are stored as chunks
+CHUNK_THRESHOLD = int(os.getenv("NOTE_CHUNK_THRESHOLD", str(256 * 1024)))
+CHUNK_SIZE = int(os.getenv("NOTE_CHUNK_SIZE", str(64 * 1024)))
+SEQ_STEP = 1 << 20
+
+def should_chunk(content: str) -> bool:
+    return len(content) > CHUNK_THRESHOLD
+
+def split_content(content: str) -> List[str]:
+    """Split text into roughly CHUNK_SIZE pieces of even length"""
+    if not content:
+        return []
+    count = math.ceil(len(content) / CHUNK_SIZE)
+    length = math.ceil(len(content) / count)
+    return [content[i:i + length] for i in range(0, len(content), length)]
+
+def _chunk(seq: int, data: str) -> NoteChunk:
+    return NoteChunk(seq=seq, size=len(data.encode()), data=data)
+
+def build_chunks(content: str, base: int = 0) -> List[NoteChunk]:
+    return [_chunk(base + (i + 1) * SEQ_STEP, piece) for i, piece in enumerate(split_content(content))]
+
+def write_chunks(note: Note, content: str) -> Optional[str]:
+    """Store new content for a chunked note, rewriting only the chunks that changed
+    
+    Whole chunks that still match at the start and end of the new content
+    are kept, so an edit near the end of a large note touches one or two
+    rows. Returns the previous content, or None if the note had no chunks.
+    """
+    chunks = list(note.chunks)
+    if not chunks:
+        note.chunks = build_chunks(content)
+        return None
+    previous = "".join(chunk.data for chunk in chunks)
+    
+    start, position = 0, 0
+    while start < len(chunks) and content.startswith(chunks[start].data, position):
+        position += len(chunks[start].data)
+        start += 1
+    end, end_position = len(chunks), len(content)
+    while end > start and end_position - len(chunks[end - 1].data) >= position and \
+            content.endswith(chunks[end - 1].data, position, end_position):
+        end_position -= len(chunks[end - 1].data)
+        end -= 1
+    
+    replaced = chunks[start:end]
+    pieces = split_content(content[position:end_position])
+    # Rewrite replaced chunks in place first, then delete or insert the difference
+    for chunk, piece in zip(replaced, pieces):
+        if chunk.data != piece:
+            chunk.data = piece
+            chunk.size = len(piece.encode())
+    for chunk in replaced[len(pieces):]:
+        note.chunks.remove(chunk)
+    extra = pieces[len(replaced):]
+    if extra:
+        low = replaced[-1].seq if replaced else (chunks[start - 1].seq if start else 0)
+        high = chunks[end].seq if end < len(chunks) else low + SEQ_STEP * (len(extra) + 1)
+        step = (high - low) // (len(extra) + 1)
+        if step == 0:
+            # No room left between the neighbours; rewrite the note under fresh
+            # keys, since rows are inserted before the old ones are deleted
+            note.chunks = build_chunks(content, base=chunks[-1].seq)
+            return previous
+        new_chunks = [_chunk(low + i * step, piece) for i, piece in enumerate(extra, start=1)]
+        note.chunks = sorted([*note.chunks, *new_chunks], key=lambda chunk: chunk.seq)
+    return previous
+
+def _at_version(statement, note_id: int, version: int):
+    # Every write to the chunks of a note bumps its version in the same transaction
+    return statement.join(Note, (Note.id == NoteChunk.note_id) & (Note.owner_id == NoteChunk.owner_id)).where(
+        NoteChunk.note_id == note_id, Note.version == version
+    )
+
+def chunk_layout(db, note_id: int, version: int):
+    """(seq, size) of each chunk in order, without loading the data
+    
+    Empty if the note is no longer at version.
+    """
+    statement = _at_version(select(NoteChunk.seq, NoteChunk.size), note_id, version)
+    return db.execute(statement.order_by(NoteChunk.seq)).all()
+
+def read_chunk_range(db, note_id: int, version: int, layout, start: int, end: int) -> Optional[Iterator[bytes]]:
+    """Bytes start..end (inclusive) of a chunked note, loading only the chunks involved
+    
+    The chunks are read by a single statement that also checks that the
+    note is still at the version layout was read for, so they come from
+    one snapshot even when a write replaces them while the body streams.
+    Returns None if the note has changed since, before anything is sent.
+    """
+    offsets = {}
+    offset = 0
+    for seq, size in layout:
+        if offset + size > start and offset <= end:
+            offsets[seq] = offset
+        offset += size
+    statement = _at_version(select(NoteChunk.seq, NoteChunk.data), note_id, version).where(
+        NoteChunk.seq.in_(offsets)
+    )
+    rows = iter(db.execute(statement.order_by(NoteChunk.seq), execution_options={"yield_per": 1}))
+    first = next(rows, None)
+    if first is None:
+        return None
+    
+    def generate():
+        for (seq, chunk_offset), row in itertools.zip_longest(offsets.items(), itertools.chain([first], rows)):
+            # Headers are sent by now, so a missing chunk can only cut the response short
+            if row is None or row.seq != seq:
+                raise RuntimeError(f"Chunk {seq} of note {note_id} is missing at version {version}")
+            encoded = row.data.encode()
+            yield encoded[max(start - chunk_offset, 0):end - chunk_offset + 1]
+    
+    return generate()
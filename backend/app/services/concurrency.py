@@ -0,0 +1,33 @@
+from typing import Optional
+from fastapi import HTTPException
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Parse an If-Match header of the form "3" or W/"3" into a version number"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+def resolve_expected_version(if_match: Optional[str], expected_version: Optional[int]) -> Optional[int]:
+    """Combine the If-Match header and the expected_version body field"""
+    header_version = parse_if_match(if_match)
+    if header_version is not None and expected_version is not None and header_version != expected_version:
+        raise HTTPException(status_code=400, detail="If-Match and expected_version disagree")
+    return header_version if header_version is not None else expected_version
+
+def etag(version: int) -> str:
+    """Format a version number as a strong ETag"""
+    return f'"{version}"'
+
+def version_conflict(resource: str, current_version: int) -> HTTPException:
+    """Build the 409 raised when a conditional update hits a stale version"""
+    return HTTPException(
+        status_code=409,
+        detail=f"{resource} was modified concurrently (current version {current_version})",
+        headers={"ETag": etag(current_version)},
+    )
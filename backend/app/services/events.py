@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.database.connection import engine
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = "mynotes_changes"
+SUBSCRIBER_QUEUE_SIZE = 1000
+RESYNC = "resync"
+
+def notify_changes(db, owner_id: int, changes):
+    """Queue change events that Postgres delivers to listeners on commit
+    
+    All events go out in a single statement, so a batch of writes costs
+    one extra round trip rather than one per change. Other databases have
+    no NOTIFY, so the session publishes to this worker's broker on commit.
+    Events are tagged with their owner and only delivered to that owner.
+    """
+    if not changes:
+        return
+    payloads = [json.dumps({**change, "owner": owner_id}) for change in changes]
+    if db.get_bind().dialect.name != "postgresql":
+        db.info.setdefault("pending_changes", []).extend(payloads)
+        return
+    db.execute(
+        text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+        {"channel": CHANGES_CHANNEL, "payloads": payloads},
+    )
+
+def change(entity: str, action: str, entity_id: int, version: int = None):
+    event = {"type": entity, "action": action, "id": entity_id}
+    if version is not None:
+        event["version"] = version
+    return event
+
+class ChangeBroker:
+    """Fan Postgres notifications out to every connected client of this worker
+    
+    A single LISTEN connection per worker is shared by all subscribers.
+    The listener thread is started lazily with the first subscriber.
+    """
+    
+    def __init__(self, channel: str = CHANGES_CHANNEL):
+        self.channel = channel
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+    
+    def subscribe(self, owner_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = (owner_id, asyncio.get_running_loop())
+            listens = engine.dialect.name == "postgresql"
+            if listens and (self._thread is None or not self._thread.is_alive()):
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._listen, name="change-listener", daemon=True)
+                self._thread.start()
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+    
+    def publish(self, payload: str):
+        # Resync requests go to everyone, changes only to their owner
+        owner_id = None if payload == RESYNC else json.loads(payload).get("owner")
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, (subscriber_id, loop) in subscribers:
+            if owner_id is not None and owner_id != subscriber_id:
+                continue
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, payload)
+            except RuntimeError:
+                # The subscriber's event loop is already closed
+                self.unsubscribe(queue)
+    
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, payload: str):
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # The client fell behind; drop its backlog and ask it to reload
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+    
+    def _listen(self):
+        while not self._stop_event.is_set():
+            try:
+                pooled = engine.raw_connection()
+                # Keep the listener out of the request pool for its whole lifetime
+                pooled.detach()
+                conn = pooled.dbapi_connection
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"LISTEN {self.channel}")
+                    while not self._stop_event.is_set():
+                        if not hasattr(conn, "poll"):
+                            # psycopg 3 yields notifications as they arrive
+                            for notify in conn.notifies(timeout=5, stop_after=SUBSCRIBER_QUEUE_SIZE):
+                                self.publish(notify.payload)
+                            continue
+                        if select.select([conn], [], [], 5) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            self.publish(conn.notifies.pop(0).payload)
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception("Change listener failed, reconnecting")
+                # Clients may have missed events while disconnected
+                self.publish(RESYNC)
+                self._stop_event.wait(1)
+
+broker = ChangeBroker()
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_changes(session):
+    for payload in session.info.pop("pending_changes", []):
+        broker.publish(payload)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_changes(session):
+    session.info.pop("pending_changes", None)
@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from app.database.connection import engine
+from app.services.admission import pool_capacity, pool_limit
+
+# The database round trip of a readiness check must finish within this
+# long; a slower or exhausted pool means the instance cannot serve in time
+READINESS_DB_TIMEOUT_MS = float(os.getenv("READINESS_DB_TIMEOUT_MS", "500"))
+# Not ready while this many requests wait for a database connection
+READINESS_MAX_POOL_WAITING = int(os.getenv("READINESS_MAX_POOL_WAITING", str(pool_capacity(engine))))
+# Not ready while this many requests are in flight; 0 disables the limit
+READINESS_MAX_IN_FLIGHT = int(os.getenv("READINESS_MAX_IN_FLIGHT", "0"))
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic")
+
+in_flight = 0
+
+class InFlightMiddleware:
+    """ASGI middleware counting the HTTP requests being served"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight -= 1
+
+@functools.lru_cache(maxsize=None)
+def _scripts():
+    return ScriptDirectory(ALEMBIC_DIR) if os.path.isdir(ALEMBIC_DIR) else None
+
+def migration_heads() -> frozenset:
+    """Head revisions of the migrations shipped with this code"""
+    scripts = _scripts()
+    return frozenset(scripts.get_heads()) if scripts is not None else frozenset()
+
+def migration_status(current: frozenset) -> str:
+    """How the database's revisions compare to migration_heads()
+    
+    "behind" means this code expects schema changes that have not been
+    applied. "ahead" is expected while older instances run during a
+    rolling deploy, as migrations stay compatible with the previous
+    release. Databases created without Alembic are "unversioned".
+    """
+    scripts = _scripts()
+    if not current:
+        return "unversioned"
+    if scripts is None:
+        return "unknown"
+    if current == migration_heads():
+        return "current"
+    if current <= {script.revision for script in scripts.walk_revisions()}:
+        return "behind"
+    return "ahead"
+
+def probe_database(db_engine=engine) -> dict:
+    """Time a round trip through the pool and read the applied migrations"""
+    started = time.perf_counter()
+    with db_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        latency_ms = (time.perf_counter() - started) * 1000
+        if db_engine.dialect.has_table(connection, "alembic_version"):
+            current = frozenset(connection.execute(text("SELECT version_num FROM alembic_version")).scalars())
+        else:
+            current = frozenset()
+    return {"latency_ms": round(latency_ms, 2), "current": current}
+
+def pool_stats(db_engine=engine) -> dict:
+    pool = db_engine.pool
+    capacity = pool_capacity(db_engine)
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+    return {
+        "capacity": capacity,
+        "checked_out": checked_out,
+        "utilization": round(checked_out / capacity, 3),
+        "waiting": pool_limit.waiting,
+    }
+
+# Probes run one at a time on a thread of their own, so a probe stuck on an
+# exhausted pool neither takes a request thread nor gets company
+_probe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="readiness-probe")
+_pending_probe = None
+
+async def readiness(db_engine=engine):
+    """Check whether this instance can serve requests; returns (ready, report)"""
+    global _pending_probe
+    problems = []
+    database = {"ok": False, "latency_ms": None, "timeout_ms": READINESS_DB_TIMEOUT_MS}
+    migrations = {"status": "unknown", "current": [], "head": sorted(migration_heads())}
+    if _pending_probe is not None and not _pending_probe.done():
+        problems.append("previous database probe has not finished")
+    else:
+        _pending_probe = _probe_executor.submit(probe_database, db_engine)
+        try:
+            probe = await asyncio.wait_for(asyncio.wrap_future(_pending_probe), READINESS_DB_TIMEOUT_MS / 1000)
+        except asyncio.TimeoutError:
+            problems.append(f"database round trip took over {READINESS_DB_TIMEOUT_MS:g} ms")
+        except Exception as e:
+            database["error"] = str(e).splitlines()[0]
+            problems.append("database unreachable")
+        else:
+            database.update(ok=True, latency_ms=probe["latency_ms"])
+            migrations.update(status=migration_status(probe["current"]), current=sorted(probe["current"]))
+            if migrations["status"] == "behind":
+                problems.append("database schema is behind the migration head")
+    
+    pool = pool_stats(db_engine)
+    if pool["waiting"] >= READINESS_MAX_POOL_WAITING:
+        problems.append(f"{pool['waiting']} requests waiting for a database connection")
+    if READINESS_MAX_IN_FLIGHT and in_flight >= READINESS_MAX_IN_FLIGHT:
+        problems.append(f"{in_flight} requests in flight")
+    
+    return not problems, {
+        "status": "ready" if not problems else "not ready",
+        "problems": problems,
+        "database": database,
+        "pool": pool,
+        "in_flight": in_flight,
+        "migrations": migrations,
+    }
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app.database.connection import SessionLocal
+from app.models.models import IdempotencyKey
+from app.services.owners import get_owner_id
+
+logger = logging.getLogger(__name__)
+
+# Clients retrying a POST or PUT send the same Idempotency-Key header and
+# get the stored response of the first attempt instead of running it again
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Upper bound on stored keys; the oldest are purged first
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+# Larger responses are not stored, so retrying such a request runs it again
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(4 * 1024 * 1024)))
+# A claimed key without a response after this long belongs to a request that died
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+
+MAX_KEY_LENGTH = 255
+METHODS = ("POST", "PUT")
+# Responses a retry should not get back: the request may well succeed next time
+RETRYABLE_STATUSES = (408, 429)
+# Per-request headers that are set afresh on a replayed response
+UNSTORED_HEADERS = (b"set-cookie", b"date", b"server")
+
+def fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+def claim_key(owner_id: int, key: str, request_fingerprint: str, session_factory=SessionLocal):
+    """Claim key for a new request, or return the stored IdempotencyKey row if it is taken"""
+    now = datetime.now(timezone.utc)
+    stale = or_(
+        IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        and_(
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        ),
+    )
+    with session_factory() as db:
+        for _ in range(3):
+            db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key, stale,
+            ))
+            db.add(IdempotencyKey(owner_id=owner_id, key=key, fingerprint=request_fingerprint))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+            record = db.scalars(select(IdempotencyKey).where(
+                IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key,
+            )).first()
+            if record is not None:
+                return record
+    raise RuntimeError(f"Could not claim idempotency key {key!r}")
+
+def store_response(owner_id: int, key: str, status_code: int, headers: list, body: bytes,
+                   session_factory=SessionLocal):
+    with session_factory() as db:
+        db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key)
+            .values(status_code=status_code, headers=json.dumps(headers), body=body)
+        )
+        db.commit()
+
+def release_key(owner_id: int, key: str, session_factory=SessionLocal):
+    """Forget a claimed key so a retry runs the request again"""
+    with session_factory() as db:
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None),
+        ))
+        db.commit()
+
+def purge_idempotency_keys(session_factory=SessionLocal) -> int:
+    """Delete expired keys and the oldest keys beyond IDEMPOTENCY_MAX_KEYS"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    with session_factory() as db:
+        purged = db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+        newest_dropped = (
+            select(IdempotencyKey.id).order_by(IdempotencyKey.id.desc()).offset(IDEMPOTENCY_MAX_KEYS).limit(1)
+        ).scalar_subquery()
+        purged += db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.id <= newest_dropped),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+    return purged
+
+def _replay(record: IdempotencyKey):
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers)]
+    headers.append((b"idempotent-replayed", b"true"))
+    return record.status_code, headers, record.body
+
+class IdempotencyMiddleware:
+    """ASGI middleware making POST and PUT requests with an Idempotency-Key safe to retry
+    
+    The first request with a key runs as usual and its response is stored
+    under the key for IDEMPOTENCY_TTL_SECONDS. A retry with the same key
+    gets that response back without running again; a retry arriving while
+    the first request is still running gets 409, and reusing a key for a
+    different request gets 422. Keys are scoped to the owner.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400,
+            )(scope, receive, send)
+            return
+        try:
+            owner_id = get_owner_id(request)
+        except HTTPException:
+            # Rejected by the route's owner dependency; there is nothing to store
+            await self.app(scope, receive, send)
+            return
+        
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        request_fingerprint = fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+        record = await run_in_threadpool(claim_key, owner_id, key, request_fingerprint)
+        if record is not None:
+            await self._reject_or_replay(record, request_fingerprint, scope, receive, send)
+            return
+        
+        body_sent = False
+        
+        async def buffered_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+        
+        response = {"status": None, "headers": [], "body": [], "size": 0}
+        
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in message.get("headers", []) if name.lower() not in UNSTORED_HEADERS
+                ]
+            elif message["type"] == "http.response.body" and response["body"] is not None:
+                response["size"] += len(message.get("body", b""))
+                if response["size"] > IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    response["body"] = None
+                else:
+                    response["body"].append(message.get("body", b""))
+            await send(message)
+        
+        stored = False
+        try:
+            await self.app(scope, buffered_receive, recording_send)
+            status = response["status"]
+            if status is not None and status < 500 and status not in RETRYABLE_STATUSES:
+                if response["body"] is None:
+                    logger.warning("Response to %s %s too large to store for idempotent retries",
+                                   scope["method"], scope["path"])
+                else:
+                    await run_in_threadpool(
+                        store_response, owner_id, key, status, response["headers"], b"".join(response["body"]),
+                    )
+                    stored = True
+        finally:
+            if not stored:
+                await run_in_threadpool(release_key, owner_id, key)
+    
+    async def _reject_or_replay(self, record: IdempotencyKey, request_fingerprint: str, scope, receive, send):
+        if record.fingerprint != request_fingerprint:
+            response = JSONResponse(
+                {"detail": f"{IDEMPOTENCY_HEADER} was already used for a different request"}, status_code=422,
+            )
+        elif record.status_code is None:
+            response = JSONResponse(
+                {"detail": f"A request with this {IDEMPOTENCY_HEADER} is still being processed"},
+                status_code=409, headers={"Retry-After": "1"},
+            )
+        else:
+            status, headers, body = _replay(record)
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+        await response(scope, receive, send)
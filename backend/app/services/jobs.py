@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import update, select, delete, func
+from app.database.connection import SessionLocal
+from app.models.models import Job
+from app.schemas.schemas import Job as JobSchema
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+# A running job without a progress update for this long is considered dead
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+
+# Files jobs leave for their owner to download, such as exports. They are
+# only served through the owner-checked result download route.
+JOB_RESULT_DIR = os.getenv(
+    "JOB_RESULT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "job_results"),
+)
+
+# Finished jobs and their result files are deleted this long after they finish
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+handlers = {}
+
+def job_handler(kind: str):
+    """Register a function as the handler for a kind of job
+    
+    Handlers are called as handler(context, **params) in a worker thread
+    and return a JSON-serializable result.
+    """
+    def register(func):
+        handlers[kind] = func
+        return func
+    return register
+
+def result_file_path(job_id: int) -> str:
+    return os.path.join(JOB_RESULT_DIR, str(job_id))
+
+def write_result_file(job_id: int, data: bytes) -> str:
+    """Store the downloadable result of a job and return its URL"""
+    os.makedirs(JOB_RESULT_DIR, exist_ok=True)
+    # Write to a temp file and rename so downloads never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=JOB_RESULT_DIR)
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, result_file_path(job_id))
+    return f"/api/jobs/{job_id}/result/download"
+
+def purge_finished_jobs(retention_seconds: int = JOB_RETENTION_SECONDS, session_factory=SessionLocal) -> int:
+    """Delete jobs that finished longer ago than the retention period, and their result files
+    
+    Files are expired by their modification time, which also catches files
+    whose job is gone and temp files left by an interrupted write.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention_seconds)
+    with session_factory() as db:
+        purged = db.execute(
+            delete(Job).where(Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff)
+        ).rowcount
+        db.commit()
+    if os.path.isdir(JOB_RESULT_DIR):
+        for entry in os.scandir(JOB_RESULT_DIR):
+            if entry.is_file() and entry.stat().st_mtime < cutoff.timestamp():
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+    return purged
+
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    def __init__(self, job_id: int, owner_id: Optional[int] = None, session_factory=SessionLocal):
+        self.job_id = job_id
+        self.owner_id = owner_id
+        self.session_factory = session_factory
+    
+    def progress(self, done: int, total: Optional[int] = None):
+        """Record progress and stop the job if it has been cancelled
+        
+        Handlers should call this between batches of work; it raises
+        JobCancelled once a cancellation was requested.
+        """
+        values = {"progress_done": done, "heartbeat_at": func.now()}
+        if total is not None:
+            values["progress_total"] = total
+        with self.session_factory() as db:
+            cancel_requested = db.execute(
+                update(Job).where(Job.id == self.job_id).values(**values).returning(Job.cancel_requested)
+            ).scalar()
+            db.commit()
+        if cancel_requested:
+            raise JobCancelled()
+
+class JobRunner:
+    """Run registered jobs on a bounded thread pool, tracking them in the jobs table
+    
+    Jobs are claimed with a conditional UPDATE, so a job is only ever run
+    once even when several API workers pick up the same queued row.
+    """
+    
+    def __init__(self, workers: int = JOB_WORKERS, session_factory=SessionLocal):
+        self.workers = workers
+        self.session_factory = session_factory
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    def _enqueue(self, job_id: int):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            self._pending += 1
+            self._executor.submit(self._run, job_id)
+    
+    def submit(self, db, kind: str, params: dict, owner_id: Optional[int] = None) -> Job:
+        """Persist a new job run on behalf of owner_id and queue it for this worker's pool"""
+        if kind not in handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._pending >= JOB_QUEUE_LIMIT:
+            raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "30"})
+        job = Job(kind=kind, params=json.dumps(params), owner_id=owner_id)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._enqueue(job.id)
+        return job
+    
+    def cancel(self, db, job_id: int, owner_id: Optional[int] = None) -> Job:
+        """Cancel a queued job at once, or ask a running one to stop"""
+        job = db.query(Job).filter(Job.id == job_id, Job.owner_id == owner_id).first()
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status == "queued":
+            db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(status="cancelled", cancel_requested=True, finished_at=func.now())
+            )
+        elif job.status == "running":
+            db.execute(update(Job).where(Job.id == job_id).values(cancel_requested=True))
+        db.commit()
+        db.refresh(job)
+        return job
+    
+    def _run(self, job_id: int):
+        try:
+            with self.session_factory() as db:
+                claimed = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", started_at=func.now(), heartbeat_at=func.now())
+                    .returning(Job.kind, Job.params, Job.owner_id)
+                ).first()
+                db.commit()
+            if claimed is None:
+                return
+            
+            try:
+                context = JobContext(job_id, claimed.owner_id, self.session_factory)
+                result = handlers[claimed.kind](context, **json.loads(claimed.params))
+                self._finish(job_id, "succeeded", result=json.dumps(result))
+            except JobCancelled:
+                self._finish(job_id, "cancelled")
+            except Exception as e:
+                logger.exception("Job %d (%s) failed", job_id, claimed.kind)
+                self._finish(job_id, "failed", error=str(e) or type(e).__name__)
+        finally:
+            with self._lock:
+                self._pending -= 1
+    
+    def _finish(self, job_id: int, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        with self.session_factory() as db:
+            db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(status=status, result=result, error=error, finished_at=func.now())
+            )
+            db.commit()
+    
+    def recover(self):
+        """Fail jobs abandoned by a dead process and queue jobs nobody picked up"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)
+        with self.session_factory() as db:
+            db.execute(
+                update(Job)
+                .where(Job.status == "running", Job.heartbeat_at < cutoff)
+                .values(status="failed", error="Interrupted", finished_at=func.now())
+            )
+            db.commit()
+            queued = db.scalars(select(Job.id).where(Job.status == "queued").order_by(Job.id)).all()
+        for job_id in queued:
+            self._enqueue(job_id)
+    
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # Queued jobs stay queued in the table and are picked up on restart
+            executor.shutdown(wait=False, cancel_futures=True)
+
+runner = JobRunner()
+
+def wants_async(prefer: Optional[str]) -> bool:
+    """Whether a Prefer header asks for the request to be run as a job (RFC 7240)"""
+    return prefer is not None and "respond-async" in [token.strip().lower() for token in prefer.split(",")]
+
+def accepted(job: Job) -> JSONResponse:
+    """202 response pointing at the status of a submitted job"""
+    return JSONResponse(
+        status_code=202,
+        content=JobSchema.model_validate(job).model_dump(mode="json"),
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
@@ -0,0 +1,42 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import Header, HTTPException, Request
+
+# The owner of a request is set by the authenticating proxy in front of the
+# API, which proves itself with OWNER_PROXY_TOKEN in X-Proxy-Token. Without
+# a token configured the owner header is rejected and every request belongs
+# to the default owner, so single-user installs work without a proxy.
+OWNER_HEADER = os.getenv("OWNER_HEADER", "X-Owner-Id")
+DEFAULT_OWNER_ID = int(os.getenv("DEFAULT_OWNER_ID", "1"))
+OWNER_PROXY_TOKEN = os.getenv("OWNER_PROXY_TOKEN", "")
+# Admin routes are only served to requests carrying this token in
+# X-Admin-Token; without one configured they do not exist
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def get_owner_id(request: Request) -> int:
+    """Dependency returning the ID of the user a request acts for"""
+    value = request.headers.get(OWNER_HEADER)
+    if OWNER_PROXY_TOKEN:
+        # Requests that bypass the proxy must not fall back to the default owner either
+        token = request.headers.get("X-Proxy-Token")
+        if token is None or not hmac.compare_digest(token.encode(), OWNER_PROXY_TOKEN.encode()):
+            raise HTTPException(status_code=403, detail="Requests must come through the owner proxy")
+    elif value is not None:
+        raise HTTPException(status_code=403, detail=f"{OWNER_HEADER} is only accepted from a configured proxy")
+    if value is None:
+        return DEFAULT_OWNER_ID
+    try:
+        owner_id = int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {OWNER_HEADER} header")
+    if owner_id <= 0:
+        raise HTTPException(status_code=400, detail=f"Invalid {OWNER_HEADER} header")
+    return owner_id
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency rejecting requests without the admin token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import OperationalError
+from app.database.connection import SessionLocal
+from app.models.models import Note
+from app.services.idempotency import purge_idempotency_keys
+from app.services.jobs import purge_finished_jobs
+
+logger = logging.getLogger(__name__)
+
+TRASH_RETENTION_DAYS = float(os.getenv("TRASH_RETENTION_DAYS", "30"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "3600"))
+PURGE_LOCK_TIMEOUT = os.getenv("PURGE_LOCK_TIMEOUT", "2s")
+PURGE_BATCH_PAUSE_SECONDS = float(os.getenv("PURGE_BATCH_PAUSE_SECONDS", "0.1"))
+
+_stop_event = threading.Event()
+_worker = None
+
+def purge_expired_notes(
+    retention_days: float = TRASH_RETENTION_DAYS,
+    batch_size: int = PURGE_BATCH_SIZE,
+    session_factory=SessionLocal,
+    stop_event: threading.Event = None,
+) -> int:
+    """Hard-delete notes that have been in the trash longer than the retention period
+    
+    Each batch runs in its own short transaction with a lock timeout, and
+    rows locked by concurrent writers are skipped rather than waited on.
+    Returns the number of purged notes.
+    """
+    purged = 0
+    while stop_event is None or not stop_event.is_set():
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        expired = (
+            select(Note.id)
+            .where(
+                Note.is_deleted == True,
+                Note.deleted_at < cutoff,
+            )
+            .order_by(Note.deleted_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        with session_factory() as db:
+            try:
+                if db.get_bind().dialect.name == "postgresql":
+                    db.execute(select(func.set_config("lock_timeout", PURGE_LOCK_TIMEOUT, True)))
+                result = db.execute(
+                    delete(Note).where(Note.id.in_(expired)),
+                    execution_options={"synchronize_session": False},
+                )
+                db.commit()
+            except OperationalError as e:
+                db.rollback()
+                logger.warning("Purge batch aborted: %s", e)
+                break
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            break
+        if stop_event is not None:
+            stop_event.wait(PURGE_BATCH_PAUSE_SECONDS)
+    return purged
+
+def _run_worker():
+    while not _stop_event.is_set():
+        try:
+            count = purge_expired_notes(stop_event=_stop_event)
+            if count:
+                logger.info("Purged %d expired notes from the trash", count)
+        except Exception:
+            logger.exception("Trash purge failed")
+        try:
+            count = purge_idempotency_keys()
+            if count:
+                logger.info("Purged %d idempotency keys", count)
+        except Exception:
+            logger.exception("Idempotency key purge failed")
+        try:
+            count = purge_finished_jobs()
+            if count:
+                logger.info("Purged %d finished jobs", count)
+        except Exception:
+            logger.exception("Finished job purge failed")
+        _stop_event.wait(PURGE_INTERVAL_SECONDS)
+
+def start_purge_worker():
+    """Start the background purge thread if it is enabled and not running"""
+    global _worker
+    if PURGE_INTERVAL_SECONDS <= 0 or (_worker is not None and _worker.is_alive()):
+        return
+    _stop_event.clear()
+    _worker = threading.Thread(target=_run_worker, name="trash-purge", daemon=True)
+    _worker.start()
+
+def stop_purge_worker():
+    """Signal the background purge thread to stop and wait for it"""
+    _stop_event.set()
+    if _worker is not None:
+        _worker.join(timeout=5)
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from app.models.models import Note, NoteRevision
+
+# Every Nth revision of a note is stored in full, so materializing any
+# revision applies at most N - 1 deltas
+REVISION_SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "20"))
+
+# Split HTML after each tag so diffs work on tags and text runs, not characters
+TOKEN_PATTERN = re.compile(r"(?<=>)")
+
+def _tokenize(content: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.split(content) if token]
+
+def _common_length(matches, limit: int) -> int:
+    """Binary search for the longest n <= limit with matches(n)"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if matches(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def compute_delta(source: str, target: str) -> str:
+    """Encode target as copy/insert operations against source
+    
+    Copies are character ranges of source and inserts carry literal text,
+    so the delta is roughly the size of the edit rather than the note.
+    """
+    # Autosaves usually touch one spot, so only diff the part between the
+    # common prefix and suffix
+    limit = min(len(source), len(target))
+    prefix = _common_length(lambda n: source[:n] == target[:n], limit)
+    suffix = _common_length(
+        lambda n: source[len(source) - n:] == target[len(target) - n:], limit - prefix
+    )
+    
+    ops = [["c", 0, prefix]] if prefix else []
+    source_middle = source[prefix:len(source) - suffix]
+    target_middle = target[prefix:len(target) - suffix]
+    source_tokens, target_tokens = _tokenize(source_middle), _tokenize(target_middle)
+    offsets = [prefix]
+    for token in source_tokens:
+        offsets.append(offsets[-1] + len(token))
+    
+    matcher = SequenceMatcher(None, source_tokens, target_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", offsets[i1], offsets[i2]])
+        elif j2 > j1:
+            ops.append(["i", "".join(target_tokens[j1:j2])])
+    if suffix:
+        ops.append(["c", len(source) - suffix, len(source)])
+    return json.dumps(ops, separators=(",", ":"))
+
+def apply_delta(source: str, delta: str) -> str:
+    """Rebuild the target of compute_delta from its source"""
+    parts = []
+    for op in json.loads(delta):
+        if op[0] == "c":
+            parts.append(source[op[1]:op[2]])
+        else:
+            parts.append(op[1])
+    return "".join(parts)
+
+def record_revision(db, note: Note, version: int, title: str, content: str, newer_content: str) -> NoteRevision:
+    """Store the state a note had at `version` before it was overwritten
+    
+    Every write that bumps a note's version records one, so each version
+    can be materialized. After REVISION_SNAPSHOT_INTERVAL - 1 reverse
+    deltas against the next newer version comes a full snapshot; counting
+    revisions rather than versions keeps the chains bounded.
+    """
+    last_snapshot = (
+        db.query(func.max(NoteRevision.version))
+        .filter(NoteRevision.note_id == note.id, NoteRevision.is_snapshot == True)
+        .scalar_subquery()
+    )
+    deltas_since_snapshot = db.query(func.count(NoteRevision.id)).filter(
+        NoteRevision.note_id == note.id,
+        (NoteRevision.version > last_snapshot) | last_snapshot.is_(None),
+    ).scalar()
+    is_snapshot = deltas_since_snapshot >= REVISION_SNAPSHOT_INTERVAL - 1
+    revision = NoteRevision(
+        note_id=note.id,
+        owner_id=note.owner_id,
+        version=version,
+        title=title,
+        is_snapshot=is_snapshot,
+        data=content if is_snapshot else compute_delta(newer_content, content),
+    )
+    db.add(revision)
+    # Flushed so the next revision of the note in this transaction counts it
+    db.flush([revision])
+    return revision
+
+def materialize_revision(db, note: Note, version: int) -> Optional[Tuple[NoteRevision, str]]:
+    """Return the revision at `version` together with its full content
+    
+    Loads the nearest snapshot at or above the requested version (or the
+    live note) and the deltas in between with a single query, then applies
+    them from newest to oldest. Returns None if the revision does not exist.
+    """
+    snapshot_version = (
+        db.query(NoteRevision.version)
+        .filter(
+            NoteRevision.note_id == note.id,
+            NoteRevision.version >= version,
+            NoteRevision.is_snapshot == True,
+        )
+        .order_by(NoteRevision.version)
+        .limit(1)
+        .scalar_subquery()
+    )
+    query = db.query(NoteRevision).filter(
+        NoteRevision.note_id == note.id,
+        NoteRevision.version >= version,
+        (NoteRevision.version <= snapshot_version) | snapshot_version.is_(None),
+    )
+    chain = query.order_by(NoteRevision.version.desc()).all()
+    if not chain or chain[-1].version != version:
+        return None
+    
+    if chain[0].is_snapshot:
+        content = chain[0].data
+        deltas = chain[1:]
+    else:
+        content = note.full_content
+        deltas = chain
+    for revision in deltas:
+        content = apply_delta(content, revision.data)
+    
+    return chain[-1], content
@@ -0,0 +1,39 @@
+import os
+from typing import List
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+# Rows fetched, encoded and sent per round trip by streamed list responses
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "100"))
+
+def iter_json_array(db: Session, statement, item_schema, batch_size: int):
+    """Encode the ORM rows of statement as a JSON array, one batch of rows at a time
+    
+    Rows are read with yield_per, a server-side cursor on PostgreSQL, and
+    each batch is expunged once it is encoded, so memory stays at one
+    batch however many rows there are.
+    """
+    adapter = TypeAdapter(List[item_schema])
+    yield b"["
+    separator = b""
+    for batch in db.scalars(statement, execution_options={"yield_per": batch_size}).partitions():
+        yield separator + adapter.dump_json(adapter.validate_python(batch, from_attributes=True))[1:-1]
+        separator = b","
+        # One by one, as expunge_all() would swap out the identity map yield_per is loading into
+        for instance in list(db.identity_map.values()):
+            db.expunge(instance)
+    yield b"]"
+
+def json_array_response(db: Session, statement, item_schema):
+    """StreamingResponse sending the rows of statement as they are read
+    
+    The rows are read on a session of their own, bound to the same engine
+    as db, as the request's session may be closed before the response is
+    sent. A failure after the first batch can only cut the response short.
+    """
+    def generate():
+        with Session(bind=db.get_bind()) as stream_db:
+            yield from iter_json_array(stream_db, statement, item_schema, STREAM_BATCH_SIZE)
+    
+    return StreamingResponse(generate(), media_type="application/json")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compare request latency of the SQLite and PostgreSQL backends
+
+Runs the same workload against each configured DATABASE_URL in a fresh
+process and prints p50/p95 latencies per operation. SQLite always runs
+against a temporary file; set BENCH_POSTGRES_URL to include PostgreSQL,
+which is then run with both the psycopg2 and, if installed, the psycopg 3
+driver.
+
+    python benchmarks/bench_backends.py [iterations]
+"""
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_workload(iterations: int):
+    """Run the workload against the DATABASE_URL of this process"""
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.database.connection import engine, Base
+    
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+    timings = {name: [] for name in ("create", "get", "update", "list", "search", "sync")}
+    
+    def timed(name, method, *args, **kwargs):
+        start = time.perf_counter()
+        response = method(*args, **kwargs)
+        timings[name].append(time.perf_counter() - start)
+        response.raise_for_status()
+        return response
+    
+    try:
+        folder_id = client.post("/api/folders/", json={"name": "Bench"}).json()["id"]
+        for i in range(iterations):
+            note = timed("create", client.post, "/api/notes/", json={
+                "title": f"Note {i}",
+                "content": f"<p>benchmark paragraph {i} " + "lorem ipsum " * 50 + "</p>",
+                "folder_id": folder_id,
+            }).json()
+            timed("get", client.get, f"/api/notes/{note['id']}")
+            timed("update", client.put, f"/api/notes/{note['id']}", json={"content": f"<p>edited {i}</p>"})
+            if i % 10 == 0:
+                timed("list", client.get, "/api/notes/", params={"folder_id": folder_id})
+                timed("search", client.get, "/api/notes/search", params={"q": "lorem"})
+                # Half of each sync batch updates notes synced before
+                timed("sync", client.post, "/api/notes/sync", json=[
+                    {"title": f"Synced {i // 20 * 10 + j}", "content": f"<p>sync {i} {j}</p>", "folder_id": folder_id}
+                    for j in range(20)
+                ])
+    finally:
+        Base.metadata.drop_all(bind=engine)
+    
+    return {
+        name: {
+            "p50": statistics.median(values) * 1000,
+            "p95": statistics.quantiles(values, n=20)[-1] * 1000 if len(values) > 1 else values[0] * 1000,
+        }
+        for name, values in timings.items()
+    }
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {"sqlite": f"sqlite:///{os.path.join(tmp, 'bench.db')}"}
+        postgres_url = os.getenv("BENCH_POSTGRES_URL")
+        if postgres_url:
+            _, _, rest = postgres_url.partition("://")
+            backends["psycopg2"] = f"postgresql+psycopg2://{rest}"
+            if importlib.util.find_spec("psycopg"):
+                backends["psycopg"] = f"postgresql+psycopg://{rest}"
+        
+        results = {}
+        for name, url in backends.items():
+            # A fresh process per backend, since the engine is created on import
+            env = dict(os.environ, DATABASE_URL=url, DATABASE_READ_URL="", CACHE_URL="memory://", ADMISSION_ENABLED="false")
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", str(iterations)],
+                env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            results[name] = json.loads(output.splitlines()[-1])
+    
+    print(f"{'operation':<10}" + "".join(f"{name + ' p50':>18}{name + ' p95':>18}" for name in results))
+    for operation in next(iter(results.values())):
+        row = f"{operation:<10}"
+        for timings in results.values():
+            row += f"{timings[operation]['p50']:>15.2f} ms{timings[operation]['p95']:>15.2f} ms"
+        print(row)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        print(json.dumps(run_workload(int(sys.argv[2]))))
+    else:
+        main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Replay captured traffic against a running server
+
+Reads a capture written with TRAFFIC_CAPTURE_FILE set, seeds folders and
+notes for a replay owner, then sends requests with the captured mix,
+body sizes and pacing, compressed by the speed-up factor. Prints latency
+percentiles per route next to the latency seen during capture.
+
+    python benchmarks/replay_traffic.py traffic.jsonl [--url http://localhost:8000] [--speed 10]
+"""
+import argparse
+import http.client
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+FILLER = "lorem ipsum dolor sit amet "
+SEARCH_WORDS = ["lorem", "ipsum", "dolor", "replay", "note"]
+# Event streams stay open for the whole session, so they are not replayed
+DEFAULT_SKIP = r"^/api/events$"
+
+def load_capture(path: str):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted((r for r in records if r.get("route")), key=lambda r: r["ts"])
+
+def filler(size: int) -> str:
+    return "<p>" + (FILLER * (size // len(FILLER) + 1))[:max(size - 7, 0)] + "</p>"
+
+class Replayer:
+    def __init__(self, base_url: str, owner: int, concurrency: int, seed: int = 0):
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.headers = {"Content-Type": "application/json", "X-Owner-Id": str(owner)}
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        self.ids = {"folder_id": [], "note_id": []}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+    
+    def send(self, method: str, path: str, body=None, headers=None):
+        """Send one request over this thread's connection; returns (status, body, seconds)"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self.connection_class(self.netloc, timeout=60)
+        payload = None if body is None else json.dumps(body).encode()
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers={**self.headers, **(headers or {})})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            raise
+        return response.status, data, time.perf_counter() - started
+    
+    def seed(self, folders: int, notes: int, note_size: int):
+        """Create the folders and notes that replayed requests refer to"""
+        for i in range(folders):
+            status, data, _ = self.send("POST", "/api/folders/", {"name": f"Replay {i}"})
+            if status != 200:
+                raise RuntimeError(f"Seeding folders failed with HTTP {status}: {data[:200]!r}")
+            self.ids["folder_id"].append(json.loads(data)["id"])
+        for i in range(notes):
+            _, data, _ = self.send("POST", "/api/notes/", {
+                "title": f"Replay note {i}",
+                "content": filler(note_size),
+                "folder_id": self.rng.choice(self.ids["folder_id"]),
+            })
+            self.ids["note_id"].append(json.loads(data)["id"])
+    
+    def pick(self, name: str):
+        with self.lock:
+            if name in self.ids and self.ids[name]:
+                return self.rng.choice(self.ids[name])
+            if name == "version":
+                return 1
+        return None
+    
+    def body(self, method: str, route: str, size: int):
+        """A JSON body for the route of roughly the captured size"""
+        if method == "POST" and route == "/api/folders/":
+            return {"name": "Replay folder"}
+        if method == "PUT" and route == "/api/folders/{folder_id}":
+            return {"name": "Replay folder renamed"}
+        if route == "/api/folders/{folder_id}/move":
+            return {"parent_id": None}
+        if method == "POST" and route == "/api/notes/":
+            return {"title": "Replay note", "content": filler(size - 60), "folder_id": self.pick("folder_id")}
+        if method == "PUT" and route == "/api/notes/{note_id}":
+            return {"content": filler(size - 20)}
+        if route == "/api/notes/sync":
+            count = max(1, size // 2048)
+            return [{"title": f"Replay sync {i}", "content": filler(size // count - 60)} for i in range(count)]
+        if route == "/api/batch":
+            count = max(1, size // 512)
+            return {"operations": [
+                {"type": "note", "action": "update", "id": self.pick("note_id"),
+                 "data": {"content": filler(size // count - 80)}}
+                for _ in range(count)
+            ]}
+        return None
+    
+    def build(self, record: dict):
+        """(method, path, body, headers) for a captured record, or None if it cannot be replayed"""
+        route = record["route"]
+        values = {}
+        for name in re.findall(r"{(\w+)}", route):
+            values[name] = self.pick(name)
+            if values[name] is None:
+                return None
+        path = route.format(**values)
+        
+        query = {}
+        for name in record["query"]:
+            if name == "q":
+                query[name] = self.rng.choice(SEARCH_WORDS)
+            elif name == "folder_id":
+                query[name] = self.pick("folder_id")
+            elif name == "limit":
+                query[name] = 20
+        if query:
+            path += "?" + urlencode(query)
+        
+        headers = {}
+        if "async" in record["flags"]:
+            headers["Prefer"] = "respond-async"
+        if "range" in record["flags"]:
+            headers["Range"] = "bytes=0-65535"
+        body = self.body(record["method"], route, record["request_bytes"]) if record["request_bytes"] else None
+        return record["method"], path, body, headers
+    
+    def forget(self, path: str):
+        """Stop referring to a folder or note the replay deleted"""
+        match = re.fullmatch(r"/api/(folders|notes)/(\d+)", path.split("?")[0])
+        if match:
+            ids = self.ids["folder_id" if match.group(1) == "folders" else "note_id"]
+            with self.lock:
+                if int(match.group(2)) in ids and len(ids) > 1:
+                    ids.remove(int(match.group(2)))
+    
+    def replay(self, records, speed: float):
+        """Send the records on the captured schedule; returns results per route and the worst lag"""
+        results = defaultdict(lambda: {"latencies": [], "errors": 0, "skipped": 0, "captured": []})
+        lag = [0.0]
+        
+        def run(record, request, due):
+            key = f"{record['method']} {record['route']}"
+            late = time.perf_counter() - due
+            with self.lock:
+                lag[0] = max(lag[0], late)
+            try:
+                status, _, seconds = self.send(*request[:2], body=request[2], headers=request[3])
+            except (OSError, http.client.HTTPException):
+                with self.lock:
+                    results[key]["errors"] += 1
+                return
+            if record["method"] == "DELETE" and status < 400:
+                self.forget(request[1])
+            with self.lock:
+                results[key]["latencies"].append(seconds)
+                if status >= 500 or (status >= 400 and record["status"] < 400):
+                    results[key]["errors"] += 1
+        
+        first = records[0]["ts"]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for record in records:
+                key = f"{record['method']} {record['route']}"
+                results[key]["captured"].append(record["duration_ms"] / 1000)
+                due = started + (record["ts"] - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                request = self.build(record)
+                if request is None:
+                    results[key]["skipped"] += 1
+                    continue
+                executor.submit(run, record, request, due)
+        return results, time.perf_counter() - started, lag[0]
+
+def percentile(values, fraction: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+def report(results, elapsed: float, lag: float):
+    sent = sum(len(r["latencies"]) for r in results.values())
+    print(f"{sent} requests in {elapsed:.1f}s ({sent / elapsed:.1f} req/s), worst schedule lag {lag * 1000:.0f} ms")
+    print(f"{'route':<45}{'count':>7}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'captured p50':>15}")
+    for key, result in sorted(results.items(), key=lambda item: -len(item[1]["latencies"])):
+        latencies = sorted(result["latencies"])
+        if not latencies:
+            print(f"{key:<45}{0:>7}{result['errors']:>8}  skipped {result['skipped']}")
+            continue
+        print(
+            f"{key:<45}{len(latencies):>7}{result['errors']:>8}"
+            + "".join(f"{percentile(latencies, p) * 1000:>7.1f} ms" for p in (0.5, 0.95, 0.99))
+            + f"{latencies[-1] * 1000:>7.1f} ms"
+            + f"{statistics.median(result['captured']) * 1000:>12.1f} ms"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", help="file written by the traffic capture middleware")
+    parser.add_argument("--url", default="http://localhost:8000", help="server to replay against")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay this many times faster than captured")
+    parser.add_argument("--concurrency", type=int, default=50, help="maximum requests in flight")
+    parser.add_argument("--owner", type=int, default=1, help="owner ID the replayed data is created under")
+    parser.add_argument("--folders", type=int, default=20, help="folders to seed")
+    parser.add_argument("--notes", type=int, default=200, help="notes to seed")
+    parser.add_argument("--skip", default=DEFAULT_SKIP, help="regular expression of routes not to replay")
+    parser.add_argument("--limit", type=int, help="replay only the first LIMIT records")
+    args = parser.parse_args()
+    
+    skip = re.compile(args.skip) if args.skip else None
+    records = [r for r in load_capture(args.capture) if not (skip and skip.search(r["route"]))][:args.limit]
+    if not records:
+        parser.error("no replayable records in capture")
+    
+    replayer = Replayer(args.url, args.owner, args.concurrency)
+    note_sizes = [r["request_bytes"] for r in records if r["method"] in ("POST", "PUT") and "/notes" in r["route"]]
+    replayer.seed(args.folders, args.notes, int(statistics.median(note_sizes)) if note_sizes else 2048)
+    report(*replayer.replay(records, args.speed))
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,20 @@ import sys
 import os
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from dotenv import load_dotenv
 
 def create_database():
     """Create the database if it doesn't exist"""
+    load_dotenv()
+    if os.getenv("DATABASE_URL", "").startswith("sqlite"):
+        # SQLite creates the database file on first connect
+        print("✅ Using SQLite database")
+        return
+    
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
     try:
         # Connect to PostgreSQL server (not to specific database)
-        load_dotenv()
         db_password = os.getenv("DB_PASSWORD")
         conn = psycopg2.connect(
             host="localhost",
@@ -47,35 +52,16 @@ def create_database():
 def run_migrations():
     """Run Alembic migrations"""
     try:
-        # Generate initial migration
-        print("🔄 Generating initial migration...")
-        result = subprocess.run(
-            ["alembic", "revision", "--autogenerate", "-m", "Initial migration"],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode != 0:
-            print("⚠️  Migration generation failed or no changes detected")
-            print(result.stdout)
-            print(result.stderr)
-        else:
-            print("✅ Migration generated successfully")
-        
-        # Run migrations
+        # Revisions are written and reviewed by hand in alembic/versions;
+        # setup only applies them. Output is not captured, so the progress
+        # of long data migrations is shown as they run.
         print("🔄 Running migrations...")
-        result = subprocess.run(
-            ["alembic", "upgrade", "head"],
-            capture_output=True,
-            text=True
-        )
+        result = subprocess.run(["alembic", "upgrade", "head"])
         
         if result.returncode == 0:
             print("✅ Migrations completed successfully")
         else:
-            print("❌ Migration failed:")
-            print(result.stdout)
-            print(result.stderr)
+            print("❌ Migration failed")
             sys.exit(1)
             
     except FileNotFoundError:
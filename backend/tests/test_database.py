@@ -1,15 +1,23 @@
 import pytest
 import os
 import sys
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 # Add the parent directory to sys.path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.database.connection import Base, get_db
-from app.models.models import Folder, Note
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import inspect, text
+from starlette.requests import Request
+from app.database import migrations, slow_queries
+from app.database.connection import Base, get_db, get_read_db, engine as app_engine, create_database_engine
+from app.models.models import Folder, IdempotencyKey, Job, Note
+from app.services import idempotency, jobs
+from app.services.purge import purge_expired_notes
 
 # Load environment variables
 load_dotenv()
@@ -58,6 +66,29 @@ class TestDatabaseConnection:
             next(db_generator)
         except StopIteration:
             pass
+    
+    def test_get_read_db_falls_back_to_primary(self):
+        """Test that get_read_db uses the primary when no replica is configured."""
+        request = Request({"type": "http", "headers": []})
+        db_generator = get_read_db(request)
+        db = next(db_generator)
+        assert db.get_bind() is app_engine
+        try:
+            next(db_generator)
+        except StopIteration:
+            pass
+    
+    @pytest.mark.skipif(not TEST_DATABASE_URL.startswith("postgresql+psycopg:"), reason="needs the psycopg 3 driver")
+    def test_prepare_option_prepares_on_first_use(self):
+        """Test that statements marked prepare are prepared on the server right away."""
+        psycopg_engine = create_database_engine(TEST_DATABASE_URL)
+        prepared = text("SELECT count(*) FROM pg_prepared_statements")
+        with psycopg_engine.connect() as connection:
+            connection.execute(select(1 + 1))
+            assert connection.execute(prepared).scalar() == 0
+            connection.execute(select(2 + 2).execution_options(prepare=True))
+            assert connection.execute(prepared).scalar() == 1
+        psycopg_engine.dispose()
 
 class TestFolderModel:
     """Test the Folder model."""
@@ -207,4 +238,212 @@ class TestModelRelationships:
         # In real application, we would handle this in the API
         # For now, just verify the relationship exists
         assert note.folder_id == folder.id
-        assert note.folder.name == "To Delete"
\ No newline at end of file
+        assert note.folder.name == "To Delete"
+
+class TestTrashPurge:
+    """Test the background purge of expired tombstones."""
+    
+    def test_purge_expired_notes(self, setup_database):
+        """Test that only tombstones past the retention period are purged."""
+        from datetime import datetime, timedelta, timezone
+        
+        session = TestingSessionLocal()
+        old = datetime.now(timezone.utc) - timedelta(days=60)
+        expired = [Note(title=f"Expired {i}", is_deleted=True, deleted_at=old) for i in range(5)]
+        recent = Note(title="Recently Deleted", is_deleted=True, deleted_at=datetime.now(timezone.utc))
+        live = Note(title="Live")
+        session.add_all(expired + [recent, live])
+        session.commit()
+        
+        purged = purge_expired_notes(retention_days=30, batch_size=2, session_factory=TestingSessionLocal)
+        assert purged == 5
+        
+        remaining = {note.title for note in session.query(Note).all()}
+        assert "Recently Deleted" in remaining
+        assert "Live" in remaining
+        assert not any(title.startswith("Expired") for title in remaining)
+        session.close()
+    
+    def test_purge_idempotency_keys(self, setup_database, monkeypatch):
+        """Test that expired keys and keys beyond the limit are purged."""
+        from datetime import datetime, timedelta, timezone
+        
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_KEYS", 2)
+        session = TestingSessionLocal()
+        old = datetime.now(timezone.utc) - timedelta(seconds=idempotency.IDEMPOTENCY_TTL_SECONDS + 60)
+        session.add(IdempotencyKey(owner_id=1, key="expired", fingerprint="", created_at=old))
+        session.add_all(IdempotencyKey(owner_id=1, key=f"key {i}", fingerprint="") for i in range(4))
+        session.commit()
+        
+        assert idempotency.purge_idempotency_keys(session_factory=TestingSessionLocal) == 3
+        assert {row.key for row in session.query(IdempotencyKey).all()} == {"key 2", "key 3"}
+        session.close()
+    
+    def test_purge_finished_jobs(self, setup_database, tmp_path, monkeypatch):
+        """Test that finished jobs and their result files are purged after the retention period."""
+        from datetime import datetime, timedelta, timezone
+        
+        monkeypatch.setattr(jobs, "JOB_RESULT_DIR", str(tmp_path))
+        session = TestingSessionLocal()
+        old = datetime.now(timezone.utc) - timedelta(seconds=7200)
+        expired = Job(kind="export", status="succeeded", finished_at=old)
+        recent = Job(kind="export", status="succeeded", finished_at=datetime.now(timezone.utc))
+        running = Job(kind="export", status="running", started_at=old)
+        session.add_all([expired, recent, running])
+        session.commit()
+        for job in (expired, recent):
+            jobs.write_result_file(job.id, b"{}")
+        os.utime(jobs.result_file_path(expired.id), (old.timestamp(), old.timestamp()))
+        
+        assert jobs.purge_finished_jobs(retention_seconds=3600, session_factory=TestingSessionLocal) == 1
+        remaining = {job_id for (job_id,) in session.query(Job.id).all()}
+        assert recent.id in remaining and running.id in remaining
+        assert expired.id not in remaining
+        assert sorted(os.listdir(tmp_path)) == [str(recent.id)]
+        session.close()
+
+class TestMigrationHelpers:
+    """Test the online migration helpers used by Alembic revisions."""
+    
+    @pytest.fixture
+    def connection(self):
+        connection = engine.connect()
+        connection.execute(text("DROP TABLE IF EXISTS backfill_test"))
+        connection.execute(text("CREATE TABLE backfill_test (id INTEGER PRIMARY KEY, value INTEGER, doubled INTEGER)"))
+        for i in range(1, 26):
+            connection.execute(text("INSERT INTO backfill_test (id, value) VALUES (:id, :id)"), {"id": i})
+        connection.commit()
+        context = MigrationContext.configure(connection)
+        with Operations.context(context), context.begin_transaction():
+            yield connection
+        connection.rollback()
+        connection.execute(text("DROP TABLE backfill_test"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {migrations.PROGRESS_TABLE}"))
+        connection.commit()
+        connection.close()
+    
+    def test_backfill_in_batches(self, connection):
+        """Test that a backfill visits every row and cleans up its checkpoint."""
+        updated = migrations.backfill("backfill_test", "doubled = value * 2", batch_size=10, pause=0)
+        assert updated == 25
+        rows = connection.execute(text("SELECT value, doubled FROM backfill_test")).all()
+        assert all(doubled == value * 2 for value, doubled in rows)
+        assert not inspect(connection).has_table(migrations.PROGRESS_TABLE)
+    
+    def test_backfill_resumes_after_checkpoint(self, connection):
+        """Test that a rerun continues after the last committed batch."""
+        connection.execute(text(
+            f"CREATE TABLE {migrations.PROGRESS_TABLE} (name VARCHAR(255) PRIMARY KEY, last_key BIGINT NOT NULL)"
+        ))
+        connection.execute(text(f"INSERT INTO {migrations.PROGRESS_TABLE} VALUES ('double', 20)"))
+        connection.commit()
+        
+        updated = migrations.backfill("backfill_test", "doubled = value * 2", name="double", batch_size=10, pause=0)
+        assert updated == 5
+        done = connection.execute(text("SELECT id FROM backfill_test WHERE doubled IS NOT NULL ORDER BY id")).scalars()
+        assert list(done) == [21, 22, 23, 24, 25]
+    
+    def test_backfill_where(self, connection):
+        """Test that the where clause limits the rows touched."""
+        updated = migrations.backfill("backfill_test", "doubled = 0", where="value % 5 = 0", batch_size=7, pause=0)
+        assert updated == 5
+    
+    @pytest.mark.skipif(not TEST_DATABASE_URL.startswith("postgresql"), reason="lock_timeout is PostgreSQL only")
+    def test_backfill_waits_out_locks(self, connection, monkeypatch, caplog):
+        """Test that a batch blocked by another transaction is retried."""
+        monkeypatch.setattr(migrations, "MIGRATION_LOCK_TIMEOUT", "100ms")
+        holder = engine.connect()
+        holder.execute(text("SELECT id FROM backfill_test WHERE id = 5 FOR UPDATE"))
+        release = threading.Timer(0.5, holder.rollback)
+        release.start()
+        try:
+            with caplog.at_level("INFO", logger=migrations.__name__):
+                updated = migrations.backfill("backfill_test", "doubled = value * 2", batch_size=10, pause=0)
+        finally:
+            release.join()
+            holder.close()
+        assert updated == 25
+        assert "Lock not available" in caplog.text
+    
+    def test_create_index_concurrently(self, connection):
+        """Test that index builds can be rerun."""
+        migrations.create_index_concurrently("ix_backfill_test_value", "backfill_test", ["value"])
+        if connection.dialect.name == "postgresql":
+            migrations.create_index_concurrently("ix_backfill_test_value", "backfill_test", ["value"])
+        indexes = {index["name"] for index in inspect(connection).get_indexes("backfill_test")}
+        assert "ix_backfill_test_value" in indexes
+        migrations.drop_index_concurrently("ix_backfill_test_value", "backfill_test")
+    
+    @pytest.mark.skipif(not TEST_DATABASE_URL.startswith("postgresql"), reason="partitioning is PostgreSQL only")
+    def test_create_index_concurrently_on_partitioned_table(self, connection):
+        """Test that a partitioned table gets its index through one index per partition."""
+        with migrations.autocommit():
+            connection.execute(text("CREATE TABLE partitioned_test (id INTEGER, value INTEGER) PARTITION BY HASH (id)"))
+            for remainder in range(2):
+                connection.execute(text(
+                    f"CREATE TABLE partitioned_test_p{remainder} PARTITION OF partitioned_test "
+                    f"FOR VALUES WITH (MODULUS 2, REMAINDER {remainder})"
+                ))
+        try:
+            migrations.create_index_concurrently("ix_partitioned_test_value", "partitioned_test", ["value"])
+            indexes = connection.execute(text(
+                "SELECT pg_class.relname FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname LIKE 'ix_partitioned_test_value%' AND pg_index.indisvalid ORDER BY 1"
+            )).scalars().all()
+            assert indexes == [
+                "ix_partitioned_test_value",
+                "ix_partitioned_test_value_partitioned_test_p0",
+                "ix_partitioned_test_value_partitioned_test_p1",
+            ]
+            migrations.drop_index_concurrently("ix_partitioned_test_value", "partitioned_test")
+            assert not inspect(connection).get_indexes("partitioned_test_p0")
+        finally:
+            with migrations.autocommit():
+                connection.execute(text("DROP TABLE partitioned_test"))
+
+class TestSlowQueries:
+    """Test slow statement detection on the application's engines."""
+    
+    def test_normalize(self):
+        """Test that statements differing only in literals and list lengths are grouped."""
+        normalize = slow_queries.normalize
+        assert normalize("SELECT *\n  FROM notes_p8 WHERE id IN (%(id_1_1)s, %(id_1_2)s) LIMIT 10") == (
+            "SELECT * FROM notes_p8 WHERE id IN (...) LIMIT ?"
+        )
+        assert normalize("SELECT 1 WHERE title = 'it''s' AND id IN (?, ?, ?)") == normalize(
+            "SELECT 2 WHERE title = 'x' AND id IN (?, ?)"
+        )
+        assert normalize("WHERE id IN (%(id_1_1)s::INTEGER, %(id_1_2)s::INTEGER)") == "WHERE id IN (...)"
+    
+    def test_only_side_effect_free_statements_are_explained(self):
+        """Test that EXPLAIN ANALYZE never reruns a write."""
+        assert slow_queries.explainable("SELECT notes.id FROM notes WHERE owner_id = %(owner_id)s")
+        assert not slow_queries.explainable("UPDATE notes SET title = %(title)s")
+        assert not slow_queries.explainable("SELECT notes.id FROM notes FOR UPDATE")
+        assert not slow_queries.explainable("SELECT pg_notify(%(channel)s, payload) FROM unnest(%(payloads)s) AS payload")
+        assert not slow_queries.explainable("WITH moved AS (DELETE FROM notes RETURNING id) SELECT count(*) FROM moved")
+    
+    def test_slow_statement_is_logged_and_explained(self, setup_database, monkeypatch, caplog):
+        """Test that a slow statement is logged with its parameters and, on PostgreSQL, its plan."""
+        monkeypatch.setattr(slow_queries, "SLOW_QUERY_MS", 0.001)
+        monkeypatch.setattr(slow_queries, "SLOW_QUERY_EXPLAIN_SAMPLE", 1)
+        slow_queries.slow_query_log.clear()
+        instrumented = create_database_engine(TEST_DATABASE_URL)
+        try:
+            with instrumented.connect() as connection:
+                connection.execute(select(Note.id).where(Note.id.in_([1, 2, 3]), Note.title == "x" * 500)).all()
+            slow_queries.explainer.wait()
+            
+            entry = next(
+                entry for entry in slow_queries.slow_query_log.top(200) if "IN (...)" in entry["statement"]
+            )
+            assert entry["routes"] == {"background": 1}
+            assert "chars)" in caplog.text and "x" * 101 not in caplog.text
+            if instrumented.dialect.name == "postgresql":
+                assert "Execution Time" in entry["plan"]
+            else:
+                assert entry["plan"] is None
+        finally:
+            instrumented.dispose()
+            slow_queries.slow_query_log.clear()
+
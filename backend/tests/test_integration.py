@@ -31,8 +31,8 @@ def setup_test_environment():
     Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="module")
-def api_server():
-    """Start the API server for integration tests"""
+def api_server(setup_test_environment):
+    """Start the API server for integration tests, once the tables exist"""
     # Start the server in the background
     server_process = subprocess.Popen([
         sys.executable, "-m", "uvicorn", "app.main:app", 
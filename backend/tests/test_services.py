@@ -0,0 +1,239 @@
+import pytest
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+# Add the parent directory to sys.path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache import MemoryCache, RedisCache
+from app.services.revisions import compute_delta, apply_delta
+from app.services.admission import ConcurrencyLimiter, TokenBucket
+from app.services import chunks
+from app.models.models import Note
+
+class FakeRedisServer:
+    """Tiny RESP server supporting the commands RedisCache uses."""
+    
+    def __init__(self):
+        self.data = {}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+    
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    
+    def _handle(self, conn):
+        reader = conn.makefile("rb")
+        while True:
+            line = reader.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(reader.readline()[1:-2])
+                args.append(reader.read(length + 2)[:-2].decode())
+            conn.sendall(self._execute(args))
+    
+    def _execute(self, args):
+        command = args[0].upper()
+        if command == "GET":
+            value = self.data.get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            data = value.encode()
+            return b"$%d\r\n%s\r\n" % (len(data), data)
+        if command == "SET":
+            self.data[args[1]] = args[2]
+            return b"+OK\r\n"
+        if command == "DEL":
+            removed = sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+            return b":%d\r\n" % removed
+        return b"-ERR unknown command\r\n"
+    
+    def close(self):
+        self.sock.close()
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer()
+    yield server
+    server.close()
+
+class TestMemoryCache:
+    """Test the in-process LRU/TTL cache."""
+    
+    def test_get_and_set(self):
+        cache = MemoryCache(max_entries=10, ttl=60)
+        cache.set("a", "1")
+        assert cache.get("a") == "1"
+        assert cache.get("missing") is None
+    
+    def test_evicts_least_recently_used(self):
+        cache = MemoryCache(max_entries=2, ttl=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+    
+    def test_entries_expire(self):
+        cache = MemoryCache(max_entries=10, ttl=60)
+        cache.set("a", "1", ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+    
+    def test_delete(self):
+        cache = MemoryCache()
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.delete("a", "b")
+        assert cache.get("a") is None
+        assert cache.get("b") is None
+
+class TestRedisCache:
+    """Test the shared cache against a local Redis-protocol stand-in."""
+    
+    def test_roundtrip(self, redis_server):
+        cache = RedisCache(f"redis://127.0.0.1:{redis_server.port}/0")
+        cache.set("note:1", '1:{"title": "Grüße"}')
+        assert cache.get("note:1") == '1:{"title": "Grüße"}'
+        assert redis_server.data["mynotes:note:1"] == '1:{"title": "Grüße"}'
+        
+        cache.delete("note:1")
+        assert cache.get("note:1") is None
+    
+    def test_unreachable_server_is_a_miss(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        cache = RedisCache(f"redis://127.0.0.1:{port}/0")
+        assert cache.get("note:1") is None
+        cache.set("note:1", "value")
+
+class TestRevisionDeltas:
+    """Test the reverse deltas used for revision history."""
+    
+    def test_delta_roundtrip(self):
+        source = "<p>Hello</p><p>world</p><p>again</p>"
+        target = "<p>Hello</p><p>brave new world</p>"
+        assert apply_delta(source, compute_delta(source, target)) == target
+    
+    def test_delta_is_proportional_to_edit(self):
+        source = "<p>" + "word " * 100000 + "</p>"
+        target = source.replace("</p>", "<b>edit</b></p>")
+        delta = compute_delta(target, source)
+        assert apply_delta(target, delta) == source
+        assert len(delta) < 100
+
+class TestAdmission:
+    """Test the concurrency limiter and token bucket."""
+    
+    def test_waiter_times_out_when_full(self):
+        """Test that a request is shed once the queue deadline passes."""
+        async def scenario():
+            limiter = ConcurrencyLimiter(1)
+            assert await limiter.acquire(0.05)
+            assert not await limiter.acquire(0.05)
+            limiter.release()
+            assert await limiter.acquire(0.05)
+        
+        asyncio.run(scenario())
+    
+    def test_release_hands_slot_to_oldest_waiter(self):
+        """Test that waiters are admitted in arrival order."""
+        async def scenario():
+            limiter = ConcurrencyLimiter(1)
+            await limiter.acquire(1)
+            order = []
+            
+            async def wait(name):
+                await limiter.acquire(1)
+                order.append(name)
+            
+            tasks = [asyncio.create_task(wait("first")), asyncio.create_task(wait("second"))]
+            await asyncio.sleep(0.01)
+            limiter.release()
+            await asyncio.sleep(0.01)
+            limiter.release()
+            await asyncio.gather(*tasks)
+            return order, limiter.active
+        
+        assert asyncio.run(scenario()) == (["first", "second"], 1)
+    
+    def test_token_bucket_refills(self):
+        """Test that an empty bucket reports when the next token arrives."""
+        bucket = TokenBucket(rate=10, burst=2)
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert 0 < bucket.take() <= 0.1
+        time.sleep(0.11)
+        assert bucket.take() == 0
+
+class TestNoteChunks:
+    """Test chunk-level rewrites of large note content."""
+    
+    @pytest.fixture(autouse=True)
+    def small_chunks(self, monkeypatch):
+        monkeypatch.setattr(chunks, "CHUNK_SIZE", 10)
+    
+    def _note(self, content):
+        return Note(is_chunked=True, chunks=chunks.build_chunks(content))
+    
+    def test_edit_at_end_rewrites_last_chunk(self):
+        """Test that editing the last chunk leaves the others untouched."""
+        content = "".join(f"{i:02d}-abcdefg" for i in range(5))
+        note = self._note(content)
+        before = [(chunk.seq, chunk.data) for chunk in note.chunks]
+        
+        assert chunks.write_chunks(note, content[:-1] + "G") == content
+        after = [(chunk.seq, chunk.data) for chunk in note.chunks]
+        assert after[:4] == before[:4]
+        assert after[4] == (before[4][0], "04-abcdefG")
+        
+        # Appending past the last chunk only adds one
+        chunks.write_chunks(note, content[:-1] + "G!")
+        assert [(chunk.seq, chunk.data) for chunk in note.chunks][:5] == after
+        assert note.chunks[5].data == "!"
+        assert note.full_content == content[:-1] + "G!"
+    
+    def test_growth_inserts_between_neighbours(self):
+        """Test that an edit growing one chunk keeps the keys ordered."""
+        content = "a" * 10 + "b" * 10 + "c" * 10
+        note = self._note(content)
+        updated = "a" * 10 + "B" * 35 + "c" * 10
+        chunks.write_chunks(note, updated)
+        
+        seqs = [chunk.seq for chunk in note.chunks]
+        assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+        assert note.chunks[0].data == "a" * 10 and note.chunks[-1].data == "c" * 10
+        assert note.full_content == updated
+        assert all(chunk.size == len(chunk.data.encode()) for chunk in note.chunks)
+    
+    def test_random_edits_round_trip(self):
+        """Test that arbitrary edits always reassemble to the new content."""
+        rng = random.Random(7)
+        content = "".join(rng.choice("abcdé ") for _ in range(200))
+        note = self._note(content)
+        for _ in range(200):
+            start = rng.randrange(len(content) + 1)
+            end = min(len(content), start + rng.randrange(30))
+            content = content[:start] + "".join(rng.choice("xyzü") for _ in range(rng.randrange(40))) + content[end:]
+            chunks.write_chunks(note, content)
+            assert note.full_content == content
+            seqs = [chunk.seq for chunk in note.chunks]
+            assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
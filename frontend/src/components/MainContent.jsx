@@ -489,7 +489,7 @@ const MainContent = ({ toggleSidebar, selectedFolder, isSidebarOpen }) => {
             // Load the first note in the folder
             setCurrentNote(notes[0]);
             if (contentRef.current) {
-              contentRef.current.innerHTML = notes[0].content;
+              contentRef.current.innerHTML = apiService.resolveBlobUrls(notes[0].content);
             }
           } else {
             // Create a new note for this folder
@@ -53,6 +53,14 @@ const Sidebar = ({ isOpen, onSelectFolder, selectedFolderId, toggleSidebar }) =>
       }
     };
     loadFolders();
+
+    // Reload the tree when folders change on another device
+    const unsubscribe = apiService.subscribeToChanges((change) => {
+      if (change.type === 'folder' || change.type === 'resync') {
+        loadFolders();
+      }
+    });
+    return unsubscribe;
   }, []);
 
   return (
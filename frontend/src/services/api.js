@@ -1,4 +1,9 @@
 const API_BASE_URL = 'http://localhost:8000/api';
+const API_ORIGIN = new URL(API_BASE_URL).origin;
+const WRITE_METHODS = ['POST', 'PUT'];
+// Writes are retried with the same Idempotency-Key, so the server runs them once
+const WRITE_ATTEMPTS = 3;
+const RETRY_STATUSES = [409, 429, 502, 503, 504];
 
 class ApiService {
   constructor() {
@@ -18,27 +23,54 @@ class ApiService {
   }
 
   async request(endpoint, options = {}) {
+    const { idempotencyKey, ...fetchOptions } = options;
     const url = `${API_BASE_URL}${endpoint}`;
     const config = {
+      // Send the read-your-writes cookie so reads after a write hit the primary
+      credentials: 'include',
+      ...fetchOptions,
       headers: {
         'Content-Type': 'application/json',
-        ...options.headers
-      },
-      ...options
+        ...fetchOptions.headers
+      }
     };
+    const isWrite = WRITE_METHODS.includes((config.method || 'GET').toUpperCase());
+    if (isWrite) {
+      config.headers['Idempotency-Key'] = idempotencyKey || crypto.randomUUID();
+    }
+    const attempts = isWrite ? WRITE_ATTEMPTS : 1;
 
-    try {
-      const response = await fetch(url, config);
+    for (let attempt = 1; ; attempt++) {
+      let response;
+      try {
+        response = await fetch(url, config);
+      } catch (error) {
+        // The request may have reached the server even though the response was lost
+        if (attempt < attempts) {
+          await this.backoff(attempt);
+          continue;
+        }
+        console.error('API request failed:', error);
+        throw error;
+      }
+      if (!response.ok && attempt < attempts && RETRY_STATUSES.includes(response.status)) {
+        await this.backoff(attempt, response.headers.get('Retry-After'));
+        continue;
+      }
       if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+        const error = new Error(`HTTP error! status: ${response.status}`);
+        console.error('API request failed:', error);
+        throw error;
       }
       return await response.json();
-    } catch (error) {
-      console.error('API request failed:', error);
-      throw error;
     }
   }
 
+  backoff(attempt, retryAfter = null) {
+    const seconds = Number(retryAfter) || 0.5 * 2 ** (attempt - 1);
+    return new Promise(resolve => setTimeout(resolve, seconds * 1000));
+  }
+
   // Folders API
   async getFolders() {
     if (!this.isOnline) {
@@ -88,6 +120,14 @@ class ApiService {
     }
   }
 
+  async moveFolder(folderId, parentId) {
+    // Moves need the server's cycle check, so they are not queued offline
+    return this.request(`/folders/${folderId}/move`, {
+      method: 'POST',
+      body: JSON.stringify({ parent_id: parentId })
+    });
+  }
+
   async deleteFolder(folderId) {
     if (!this.isOnline) {
       return this.deleteOfflineFolder(folderId);
@@ -105,19 +145,61 @@ class ApiService {
   }
 
   // Notes API
-  async getNotes(folderId = null) {
+  async getNotes(folderId = null, tags = [], tagMatch = 'all') {
     if (!this.isOnline) {
-      return this.getOfflineNotes(folderId);
+      return this.filterByTags(this.getOfflineNotes(folderId), tags, tagMatch);
     }
 
     try {
-      const endpoint = folderId ? `/notes?folder_id=${folderId}` : '/notes';
-      const notes = await this.request(endpoint);
-      this.saveOfflineNotes(notes);
+      const params = new URLSearchParams();
+      if (folderId) params.append('folder_id', folderId);
+      tags.forEach(tag => params.append('tag', tag));
+      if (tags.length > 1) params.append('tag_match', tagMatch);
+      const query = params.toString();
+      const notes = await this.request(query ? `/notes?${query}` : '/notes');
+      // Only the unfiltered list is a complete offline copy
+      if (tags.length === 0) {
+        this.saveOfflineNotes(notes);
+      }
       return notes;
     } catch (error) {
-      return this.getOfflineNotes(folderId);
+      return this.filterByTags(this.getOfflineNotes(folderId), tags, tagMatch);
+    }
+  }
+
+  filterByTags(notes, tags, tagMatch = 'all') {
+    if (tags.length === 0) return notes;
+    const wanted = tags.map(tag => tag.trim().toLowerCase());
+    const matches = note => wanted[tagMatch === 'any' ? 'some' : 'every'](tag => (note.tags || []).includes(tag));
+    return notes.filter(matches);
+  }
+
+  // Notes refer to images by server path; the server shortens them again on save
+  resolveBlobUrls(content) {
+    return (content || '').replace(/(["'])\/api\/blobs\//g, `$1${API_ORIGIN}/api/blobs/`);
+  }
+
+  async getTagCloud() {
+    return this.request('/notes/tags');
+  }
+
+  async getRecentNotes(limit = 20) {
+    if (this.isOnline) {
+      try {
+        return await this.request(`/notes/recent?limit=${limit}`);
+      } catch (error) {
+        // Fall back to the offline copy below
+      }
     }
+
+    return this.getOfflineNotes()
+      .sort((a, b) => (b.updated_at || '').localeCompare(a.updated_at || ''))
+      .slice(0, limit);
+  }
+
+  async autocomplete(query, limit = 10) {
+    const params = new URLSearchParams({ q: query, limit });
+    return this.request(`/autocomplete?${params}`);
   }
 
   async createNote(noteData) {
@@ -170,6 +252,42 @@ class ApiService {
     }
   }
 
+  // Background jobs
+  async exportNotes() {
+    return this.request('/export', { method: 'POST' });
+  }
+
+  async getJob(jobId) {
+    return this.request(`/jobs/${jobId}`);
+  }
+
+  async cancelJob(jobId) {
+    return this.request(`/jobs/${jobId}/cancel`, { method: 'POST' });
+  }
+
+  async waitForJob(jobId, interval = 1000) {
+    for (;;) {
+      const job = await this.getJob(jobId);
+      if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+        return job.status === 'succeeded' ? this.request(`/jobs/${jobId}/result`) : job;
+      }
+      await new Promise(resolve => setTimeout(resolve, interval));
+    }
+  }
+
+  // Live updates
+  subscribeToChanges(onChange) {
+    if (typeof EventSource === 'undefined') {
+      return () => {};
+    }
+
+    const source = new EventSource(`${API_BASE_URL}/events`, { withCredentials: true });
+    source.addEventListener('change', (event) => onChange(JSON.parse(event.data)));
+    // Sent when events may have been missed; treat it as "reload everything"
+    source.addEventListener('resync', () => onChange({ type: 'resync' }));
+    return () => source.close();
+  }
+
   // Offline storage methods
   getOfflineFolders() {
     const folders = localStorage.getItem('mynotes_folders');
@@ -301,60 +419,41 @@ class ApiService {
     if (!this.isOnline) return;
 
     const syncQueue = JSON.parse(localStorage.getItem('mynotes_sync_queue') || '[]');
-    const syncedItems = [];
-
-    for (const item of syncQueue) {
-      try {
-        if (item.type === 'note') {
-          switch (item.action) {
-            case 'create':
-              await this.request('/notes', {
-                method: 'POST',
-                body: JSON.stringify(item.data)
-              });
-              break;
-            case 'update':
-              await this.request(`/notes/${item.data.id}`, {
-                method: 'PUT',
-                body: JSON.stringify(item.data)
-              });
-              break;
-            case 'delete':
-              await this.request(`/notes/${item.data.id}`, {
-                method: 'DELETE'
-              });
-              break;
-          }
-        } else if (item.type === 'folder') {
-          switch (item.action) {
-            case 'create':
-              await this.request('/folders', {
-                method: 'POST',
-                body: JSON.stringify(item.data)
-              });
-              break;
-            case 'update':
-              await this.request(`/folders/${item.data.id}`, {
-                method: 'PUT',
-                body: JSON.stringify(item.data)
-              });
-              break;
-            case 'delete':
-              await this.request(`/folders/${item.data.id}`, {
-                method: 'DELETE'
-              });
-              break;
-          }
-        }
-        syncedItems.push(item);
-      } catch (error) {
-        console.error('Sync failed for item:', item, error);
-      }
+    if (syncQueue.length === 0) return;
+
+    // A batch whose response was lost is resent unchanged with its key, so
+    // the server replays its result instead of applying it a second time;
+    // operations queued since then go into the next batch
+    let pending = JSON.parse(localStorage.getItem('mynotes_sync_pending') || 'null');
+    if (!pending || pending.count > syncQueue.length) {
+      pending = { key: crypto.randomUUID(), count: syncQueue.length };
+      localStorage.setItem('mynotes_sync_pending', JSON.stringify(pending));
     }
+    const batch = syncQueue.slice(0, pending.count);
+
+    // Replay the whole batch atomically; creates carry their offline ID as
+    // temp_id so later operations can reference it
+    const operations = batch.map(item => ({
+      type: item.type,
+      action: item.action,
+      id: item.action === 'create' ? null : item.data.id,
+      temp_id: item.action === 'create' ? (item.data.id ?? null) : null,
+      data: item.data
+    }));
 
-    // Remove synced items from queue
-    const remainingQueue = syncQueue.filter(item => !syncedItems.includes(item));
-    localStorage.setItem('mynotes_sync_queue', JSON.stringify(remainingQueue));
+    try {
+      await this.request('/batch', {
+        method: 'POST',
+        body: JSON.stringify({ operations }),
+        idempotencyKey: pending.key
+      });
+      const remaining = JSON.parse(localStorage.getItem('mynotes_sync_queue') || '[]').slice(pending.count);
+      localStorage.setItem('mynotes_sync_queue', JSON.stringify(remaining));
+      localStorage.removeItem('mynotes_sync_pending');
+    } catch (error) {
+      // The batch is all-or-nothing, so keep the full queue and the key for the next attempt
+      console.error('Sync failed for batch:', operations, error);
+    }
   }
 }
 
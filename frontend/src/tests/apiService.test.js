@@ -333,8 +333,9 @@ describe('ApiService', () => {
 
       await apiService.syncOfflineData();
       
+      expect(fetch).toHaveBeenCalledTimes(1);
       expect(fetch).toHaveBeenCalledWith(
-        'http://localhost:8000/api/notes',
+        'http://localhost:8000/api/batch',
         expect.objectContaining({
           method: 'POST'
         })
@@ -221,10 +221,18 @@ describe('Offline Functionality', () => {
       await apiService.syncOfflineData();
       
       expect(fetch).toHaveBeenCalledWith(
-        'http://localhost:8000/api/notes',
+        'http://localhost:8000/api/batch',
         expect.objectContaining({
           method: 'POST',
-          body: JSON.stringify({ title: 'Offline Note', content: 'Content' })
+          body: JSON.stringify({
+            operations: [{
+              type: 'note',
+              action: 'create',
+              id: null,
+              temp_id: null,
+              data: { title: 'Offline Note', content: 'Content' }
+            }]
+          })
         })
       );
     });
@@ -249,10 +257,18 @@ describe('Offline Functionality', () => {
       await apiService.syncOfflineData();
       
       expect(fetch).toHaveBeenCalledWith(
-        'http://localhost:8000/api/folders/1',
+        'http://localhost:8000/api/batch',
         expect.objectContaining({
-          method: 'PUT',
-          body: JSON.stringify({ id: 1, name: 'Updated Folder', icon: '📁' })
+          method: 'POST',
+          body: JSON.stringify({
+            operations: [{
+              type: 'folder',
+              action: 'update',
+              id: 1,
+              temp_id: null,
+              data: { id: 1, name: 'Updated Folder', icon: '📁' }
+            }]
+          })
         })
       );
     });
@@ -277,9 +293,10 @@ describe('Offline Functionality', () => {
       await apiService.syncOfflineData();
       
       expect(fetch).toHaveBeenCalledWith(
-        'http://localhost:8000/api/notes/1',
+        'http://localhost:8000/api/batch',
         expect.objectContaining({
-          method: 'DELETE'
+          method: 'POST',
+          body: expect.stringContaining('"action":"delete"')
         })
       );
     });